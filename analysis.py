@@ -0,0 +1,172 @@
+import json
+import warnings
+import numpy as np
+import pandas as pd
+from money import from_minor
+from reconcile import CATEGORIES, DEBIT_NORMAL, classified_frame
+
+
+MAD_SCALE = 1.4826  # makes the MAD a consistent estimator of the standard deviation
+ANOMALY_Z = 3.5
+TOP_ANOMALIES = 20
+MIN_HISTORY_PERIODS = 4
+
+
+def classified_ledger(classified):
+    """
+    Flattens a classified JSON string/dict into one row per account, with balances as int64
+    paise in the category's normal-balance direction.
+
+    Returns:
+    - DataFrame: accountNumber, accountName, category, balance_minor
+    """
+    data = json.loads(classified) if isinstance(classified, str) else classified
+    df = classified_frame(data)
+    normal_sign = np.where(df["category"].isin(DEBIT_NORMAL).to_numpy(), 1, -1)
+    return pd.DataFrame({
+        "accountNumber": df["accountNumber"].to_numpy(),
+        "accountName": df["accountName"].astype(str).to_numpy(),
+        "category": df["category"].to_numpy(),
+        "balance_minor": df["balance_minor"].to_numpy() * normal_sign,
+    })
+
+
+def load_prior_period(file_path):
+    """
+    Loads a prior period produced by this tool: a classified JSON file, or the XLSX export
+    (its "Classified Ledger" sheet).
+
+    Returns:
+    - DataFrame: same layout as classified_ledger
+    """
+    if file_path.endswith(".json"):
+        with open(file_path, encoding="utf-8") as f:
+            return classified_ledger(f.read())
+    elif file_path.endswith(".xlsx"):
+        sheet = pd.read_excel(file_path, sheet_name="Classified Ledger", dtype={"Account Number": str})
+        return classified_ledger({
+            category: [
+                {"accountNumber": r["Account Number"], "accountName": r["Account Name"],
+                 "amount": r["Amount"], "balanceType": r["Balance Type"]}
+                for r in group.to_dict(orient="records")
+            ]
+            for category, group in sheet.groupby(sheet["Category"].str.lower())
+        })
+    else:
+        raise ValueError("Prior periods must be a classified JSON or an exported XLSX file.")
+
+
+def _robust_z(values):
+    median = np.nanmedian(values)
+    mad = np.nanmedian(np.abs(values - median)) * MAD_SCALE
+    if not np.isfinite(mad) or mad == 0:
+        return np.zeros_like(values, dtype=np.float64)
+    return (values - median) / mad
+
+
+def variance_scan(current, prior_periods, z_threshold=ANOMALY_Z):
+    """
+    Compares the current classified ledger with prior periods account by account and scores
+    unusual movements, with no LLM calls.
+
+    For every account it reports the absolute and percentage variance against the most
+    recent prior period and a robust z-score. The z-score is taken against the account's
+    own history (median/MAD over prior periods) when at least MIN_HISTORY_PERIODS periods
+    exist, and otherwise across all accounts' variances for this period. Per-account MADs
+    are floored at the median MAD of all accounts, so a short, flat history does not turn
+    a small movement into an extreme score.
+
+    Parameters:
+    - current (str | dict | DataFrame): Classified JSON for this period, or classified_ledger output.
+    - prior_periods (list): Prior periods, oldest first, in the same forms.
+    - z_threshold (float): |z| at or above which an account is flagged. New and dropped
+      accounts are always flagged.
+
+    Returns:
+    - DataFrame: one row per account, sorted by |robust_z|, with a boolean flagged column
+    """
+    current = current if isinstance(current, pd.DataFrame) else classified_ledger(current)
+    priors = [p if isinstance(p, pd.DataFrame) else classified_ledger(p) for p in prior_periods]
+    if not priors:
+        raise ValueError("At least one prior period is required for a variance scan.")
+
+    # Factorize account numbers once so every period becomes a dense int index
+    frames = [current] + priors
+    codes, accounts = pd.factorize(np.concatenate([f["accountNumber"].to_numpy(dtype=object) for f in frames]))
+    n = len(accounts)
+    offsets = np.cumsum([0] + [len(f) for f in frames])
+    frame_codes = [codes[offsets[i]:offsets[i + 1]] for i in range(len(frames))]
+
+    def period_sums(i):
+        values = frames[i]["balance_minor"].to_numpy(dtype=np.float64)
+        sums = np.bincount(frame_codes[i], weights=values, minlength=n)
+        present = np.bincount(frame_codes[i], minlength=n) > 0
+        return np.rint(sums).astype(np.int64), present
+
+    current_minor, in_current = period_sums(0)
+    hist = np.full((n, len(priors)), np.nan)
+    for p in range(len(priors)):
+        sums, present = period_sums(p + 1)
+        hist[present, p] = sums[present]
+    in_prior = ~np.isnan(hist[:, -1])
+    prior_minor = np.nan_to_num(hist[:, -1]).astype(np.int64)
+
+    # Name and category from the most recent period the account appears in
+    names = np.full(n, "", dtype=object)
+    category = np.full(n, "", dtype=object)
+    for i in list(range(1, len(frames))) + [0]:
+        names[frame_codes[i][::-1]] = frames[i]["accountName"].to_numpy(dtype=object)[::-1]
+        category[frame_codes[i][::-1]] = frames[i]["category"].to_numpy(dtype=object)[::-1]
+
+    variance_minor = current_minor - prior_minor
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(prior_minor != 0, variance_minor / np.abs(prior_minor) * 100, np.nan)
+
+    z = _robust_z(variance_minor.astype(np.float64))
+    basis = np.full(n, "cross-section", dtype=object)
+    if len(priors) >= MIN_HISTORY_PERIODS:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # accounts with no history
+            median = np.nanmedian(hist, axis=1)
+            mad = np.nanmedian(np.abs(hist - median[:, None]), axis=1) * MAD_SCALE
+        mad = np.fmax(mad, np.nanmedian(mad))
+        usable = np.isfinite(median) & np.isfinite(mad) & (mad > 0)
+        z = np.where(usable, (current_minor - median) / np.where(usable, mad, 1), z)
+        basis[usable] = "history"
+
+    status = np.select([in_current & ~in_prior, ~in_current & in_prior], ["new", "dropped"], default="existing")
+
+    keep = in_current | in_prior
+    rows = pd.DataFrame({
+        "accountNumber": accounts,
+        "accountName": names,
+        "category": category,
+        "status": status,
+        "current": from_minor(current_minor),
+        "prior": from_minor(prior_minor),
+        "variance": from_minor(variance_minor),
+        "variance_pct": np.round(pct, 2),
+        "robust_z": np.round(z, 2),
+        "z_basis": basis,
+    })[keep]
+    rows["flagged"] = (np.abs(rows["robust_z"].to_numpy()) >= z_threshold) | (rows["status"] != "existing")
+    rows = rows.iloc[np.argsort(-np.abs(rows["robust_z"].to_numpy()), kind="stable")]
+
+    print(f"✅ Variance scan: {int(rows['flagged'].sum())} of {len(rows)} accounts flagged "
+          f"against {len(priors)} prior period(s).")
+    return rows.reset_index(drop=True)
+
+
+def summarize_anomalies(rows, top_n=TOP_ANOMALIES):
+    """
+    JSON-safe summary of a variance_scan result for the UI and the HTTP service.
+
+    Returns:
+    - dict: accounts, flagged, anomalies (top_n flagged rows)
+    """
+    anomalies = rows[rows["flagged"]].head(top_n).astype(object)
+    return {
+        "accounts": len(rows),
+        "flagged": int(rows["flagged"].sum()),
+        "anomalies": anomalies.where(anomalies.notna(), None).to_dict(orient="records"),
+    }
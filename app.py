@@ -1,9 +1,10 @@
 import streamlit as st
 from dotenv import load_dotenv
 import os
-from income import generate_profit_and_loss_statement
-from classify import classify_trial_balance, segregate_financial_statements
-from balance_sheet import generate_balance_sheet  # Assuming it's in balance.py
+from pipeline import run_pipeline_cached, explain_statement
+from artifact_store import ArtifactStore
+from export import export_statements_to_bytes
+from analysis import load_prior_period
 import tempfile
 
 load_dotenv()
@@ -14,7 +15,43 @@ st.title("📊 Trial Balance Analyzer - P&L & Balance Sheet Generator")
 
 api_key = os.getenv('MISTRAL_API_KEY')
 
+
+@st.cache_resource
+def get_artifact_store():
+    # Shared across sessions so identical uploads are coalesced and reused
+    return ArtifactStore()
+
+
 uploaded_file = st.file_uploader("📂 Upload Trial Balance Excel File", type=["xlsx", "xls"])
+prior_files = st.file_uploader(
+    "🗂️ Prior Periods (optional): classified JSON or XLSX exports from this app, oldest first",
+    type=["json", "xlsx"], accept_multiple_files=True,
+)
+
+
+def render_explanation(kind, result, inline_explanation=""):
+    """Shows the statement's explanation only once the user asks for it; generated lazily and cached."""
+    state_key = f"explain_{kind}_{result['key']}"
+    if not (st.session_state.get(state_key) or st.button("💡 Explain", key=f"button_{state_key}")):
+        return
+    st.session_state[state_key] = True
+    explanation = inline_explanation
+    if not explanation:
+        with st.spinner("✍️ Writing explanation..."):
+            explanation = explain_statement(api_key, result, kind, get_artifact_store())
+    st.markdown(f"**ℹ️ Explanation:**\n\n{explanation}")
+
+
+def load_prior_periods(files):
+    # Upload order is period order (oldest first); the last file is the comparison period
+    periods = []
+    for prior in files or []:
+        suffix = os.path.splitext(prior.name)[1].lower()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_prior:
+            tmp_prior.write(prior.read())
+        periods.append(load_prior_period(tmp_prior.name))
+        os.remove(tmp_prior.name)
+    return periods
 
 if uploaded_file and api_key:
     with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_file:
@@ -23,37 +60,46 @@ if uploaded_file and api_key:
 
     with st.spinner("🔍 Processing trial balance..."):
         try:
-            # Step 1
-            st.info("🚀 Step 1: Classifying Trial Balance using LLM...")
-            classified_data = classify_trial_balance(api_key, file_path)
-            st.success("✅ Step 1 Complete: Classification done.")
-
-            # Step 2
-            st.info("🧩 Step 2: Segregating data into Balance Sheet and P&L sections...")
-            balance_sheet, pnl = segregate_financial_statements(classified_data)
-            st.success("✅ Step 2 Complete: Data segregated successfully.")
-
-            # Step 3
-            st.info("📈 Step 3: Generating Profit & Loss Statement...")
-            pnl_statement, net_profit = generate_profit_and_loss_statement(api_key, pnl)
-            st.success("✅ Step 3 Complete: P&L generated.")
-
-            # Step 4
-            st.info("📊 Step 4: Generating Balance Sheet...")
-            bs_statement = generate_balance_sheet(api_key, balance_sheet, net_profit)
-            st.success("✅ Step 4 Complete: Balance Sheet generated.")
+            try:
+                result = run_pipeline_cached(
+                    api_key, file_path, get_artifact_store(),
+                    prior_periods=load_prior_periods(prior_files), progress=st.info,
+                )
+            finally:
+                # Every rerun (e.g. each "Explain" click) writes a fresh copy of the upload
+                os.remove(file_path)
+            classified_data = result["classified"]
+            pnl_statement = result["pnl_statement"]
+            bs_statement = result["bs_statement"]
 
             st.success("✅ Financial statements generated successfully!")
+
+            reconciliation = result["reconciliation"]
+            if not reconciliation["ok"]:
+                st.warning("⚠️ Reconciliation found issues the targeted repair could not resolve.")
+            with st.expander("🧮 Reconciliation Checks", expanded=not reconciliation["ok"]):
+                st.json(reconciliation)
+
+            if "variance" in result:
+                variance = result["variance"]
+                if variance["flagged"]:
+                    st.warning(f"🚩 {variance['flagged']} of {variance['accounts']} accounts flagged "
+                               f"as unusual against prior periods.")
+                with st.expander("🔎 Period-over-Period Variance & Anomalies", expanded=bool(variance["flagged"])):
+                    st.markdown("**Top anomalies**")
+                    st.dataframe(variance["anomalies"], use_container_width=True)
+                    st.markdown("**All accounts**")
+                    st.dataframe(result["variance_table"], use_container_width=True)
             
-            # Split and display P&L
+            # Split and display P&L (statements are generated without the narrative; older
+            # cached ones may still carry it)
             pnl_parts = pnl_statement.split("Explanation:")
             pnl_text = pnl_parts[0].strip()
             pnl_explanation = pnl_parts[1].strip() if len(pnl_parts) > 1 else ""
 
             with st.expander("🧾 View Profit & Loss Statement", expanded=True):
                 st.markdown(pnl_text)
-                if pnl_explanation:
-                    st.markdown(f"**ℹ️ Explanation:**\n\n{pnl_explanation}")
+                render_explanation("profit_and_loss", result, pnl_explanation)
 
             # Split and display Balance Sheet
             bs_parts = bs_statement.split("### Explanation:")
@@ -62,7 +108,18 @@ if uploaded_file and api_key:
 
             with st.expander("📑 View Balance Sheet", expanded=True):
                 st.markdown(bs_text)
-                if bs_explanation:
-                    st.markdown(f"**ℹ️ Explanation:**\n\n{bs_explanation}")
+                render_explanation("balance_sheet", result, bs_explanation)
+
+            with st.expander("⏱️ Stage Timings, Memory & Model Routing"):
+                st.markdown(result["memory_report"])
+                if result["routing"]:
+                    st.markdown(result["routing_report"])
+
+            st.download_button(
+                "⬇️ Download Statements (XLSX)",
+                data=export_statements_to_bytes(classified_data, pnl_statement, bs_statement),
+                file_name="financial_statements.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
         except Exception as e:
             st.error(f"❌ Error: {e}")
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+
+
+DEFAULT_STORE_DIR = ".artifacts"
+HASH_CHUNK_SIZE = 1024 * 1024
+CANCEL_POLL_SECONDS = 0.5
+
+
+def content_hash(file_path):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_key(file_hash, config=None):
+    """
+    Combines a file's content hash with the settings its outputs depend on (pipeline version,
+    FX table, chart of accounts, ...), so changing any of them starts a fresh set of artifacts.
+    """
+    if not config:
+        return file_hash
+    digest = hashlib.sha256(file_hash.encode("utf-8"))
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RunCancelled(Exception):
+    """Raised to a caller of single_flight that cancelled, or by a computation nobody waits for anymore."""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for pipeline outputs, with single-flight coalescing.
+
+    Artifacts live under <root>/<key>/<name>.json and are written atomically, so every
+    upload of the same trial balance with the same settings reuses the same outputs. Scratch
+    files for an individual run go to a directory from scratch_dir(), which is removed when
+    the run is done.
+
+    Parameters:
+    - root (str): Directory for the store. Defaults to ARTIFACT_STORE_DIR or ".artifacts".
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv("ARTIFACT_STORE_DIR", DEFAULT_STORE_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def _path(self, key, name):
+        return os.path.join(self.root, key, f"{name}.json")
+
+    def has(self, key, name):
+        return os.path.exists(self._path(key, name))
+
+    def get(self, key, name, default=None):
+        try:
+            with open(self._path(key, name), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default
+
+    def put(self, key, name, value):
+        """Writes an artifact via a temp file + os.replace so readers never see a partial file."""
+        directory = os.path.join(self.root, key)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, indent=2)
+            os.replace(tmp_path, self._path(key, name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return value
+
+    def get_or_compute(self, key, name, compute, keep=None):
+        """
+        Returns the stored artifact, computing it on a miss. The computed value is stored
+        only if keep(value) is true (default: always), so failed results are recomputed on
+        the next run instead of being served from the store.
+        """
+        value = self.get(key, name)
+        if value is None:
+            value = compute()
+            if keep is None or keep(value):
+                self.put(key, name, value)
+        return value
+
+    @contextmanager
+    def scratch_dir(self, key):
+        """Creates an isolated scratch directory for one run of the pipeline on key, removed afterwards."""
+        path = os.path.join(self.root, key, "runs", uuid.uuid4().hex)
+        os.makedirs(path, exist_ok=True)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass  # other runs still have scratch directories there
+
+    def waiting(self, key):
+        """Number of callers waiting on the in-flight computation for key, besides the one running it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            return flight.waiters if flight is not None else 0
+
+    def single_flight(self, key, compute, cancelled=None):
+        """
+        Runs compute() once per key at a time. Callers that arrive while a computation for
+        the same key is in flight wait for it and receive the same result (or exception).
+
+        A waiting caller whose cancelled() turns true detaches with RunCancelled without
+        affecting the others. If the computation itself stops with RunCancelled (its own
+        caller cancelled and nobody was waiting yet), waiters that still want the result
+        start it again rather than failing.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                else:
+                    flight.waiters += 1
+
+            if leader:
+                break
+
+            print(f"⏳ Waiting for in-flight run of {key[:12]}...")
+            try:
+                while not flight.done.wait(CANCEL_POLL_SECONDS):
+                    if cancelled is not None and cancelled():
+                        raise RunCancelled()
+            finally:
+                with self._lock:
+                    flight.waiters -= 1
+            if isinstance(flight.error, RunCancelled) and not (cancelled is not None and cancelled()):
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
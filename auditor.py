@@ -1,7 +1,7 @@
 import json
 import re
 import pandas as pd
-from mistralai import Mistral
+from model_router import complete_chat
 from extract import extract_account_fields_from_file, clean_with_llm
 
 
@@ -45,10 +45,6 @@ def process_accounts_from_excel(cleaned, api_key):
     # Step 2: Convert to JSON string
     json_data = json.dumps(transformed_input, indent=4)
 
-    # Initialize Mistral LLM
-    model = "mistral-small-latest"
-    client = Mistral(api_key=api_key)
-
     # Define structured prompt explicitly
     prompt = f"""
     Your task is to process a JSON array of financial accounts and transform it into a new format.
@@ -89,11 +85,7 @@ def process_accounts_from_excel(cleaned, api_key):
 
 
     # Step 6: Send request to Mistral LLM
-    chat_response = client.chat.complete(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        
-    )
+    chat_response = complete_chat(api_key, "auditor", prompt)
 
     # Extract response text
     response_text = chat_response.choices[0].message.content.strip()
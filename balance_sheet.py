@@ -1,10 +1,12 @@
 import json
-from income import generate_profit_and_loss_statement
+from income import generate_profit_and_loss_statement, NO_EXPLANATION_RULE
 from classify import classify_trial_balance, segregate_financial_statements
 import re
-from mistralai import Mistral
+from model_router import complete_chat
+from currency import reporting_currency, currency_symbol
+from money import to_minor, format_minor
 
-def generate_balance_sheet(api_key, balance_sheet, net_profit):
+def generate_balance_sheet(api_key, balance_sheet, net_profit, include_explanation=False, currency=None):
     """
     Extracts assets, liabilities, equity, and net profit, then generates a formatted balance sheet
     using the Mistral LLM.
@@ -12,14 +14,14 @@ def generate_balance_sheet(api_key, balance_sheet, net_profit):
     Parameters:
     - api_key (str): Mistral API key.
     - classified_data_json (str): JSON string returned by the classify_trial_balance function.
-    - Net_profit: float value returned by the generate_profit_and_loss_statement function.
+    - Net_profit: int paise returned by the generate_profit_and_loss_statement function.
+    - include_explanation (bool): Let the model append a narrative. Off by default; use
+      explain_balance_sheet to generate it on demand.
+    - currency (str): ISO code of the amounts. Defaults to the reporting currency.
 
     Returns:
     - str: The formatted balance sheet.
     """
-    # Initialize Mistral client
-    model = "mistral-small-latest"
-    client = Mistral(api_key=api_key)
 
     # Parse the classified trial balance data
     try:
@@ -39,20 +41,25 @@ def generate_balance_sheet(api_key, balance_sheet, net_profit):
 
 
 
-    # Extract totals from classified data
-    total_assets = totals.get('assets', 0)
-    total_liabilities = totals.get('liabilities', 0)
-    total_equity = totals.get('equity', 0)
+    # Extract totals from classified data as exact paise (older inputs only carry rupee totals)
+    totals_minor = classified_data.get('totals_minor') or {name: to_minor(value) for name, value in totals.items()}
+    total_assets = int(totals_minor.get('assets', 0))
+    total_liabilities = int(totals_minor.get('liabilities', 0))
+    total_equity = int(totals_minor.get('equity', 0))
 
-    # Organize the extracted data
+    currency = currency or reporting_currency()
+    symbol = currency_symbol(currency)
+    label = symbol.strip()
+
+    # Organize the extracted data; amounts are only rendered to text here
     financial_data = {
         'assets': assets,
         'liabilities': liabilities,
         'equity': equity,
-        'net_profit': net_profit,
-        'total_assets': total_assets,
-        'total_liabilities': total_liabilities,
-        'total_equity': total_equity
+        'net_profit': format_minor(net_profit, symbol),
+        'total_assets': format_minor(total_assets, symbol),
+        'total_liabilities': format_minor(total_liabilities, symbol),
+        'total_equity': format_minor(total_equity, symbol)
     }
 
     print("✅8. Financial data extracted successfully for balance sheet.")
@@ -64,7 +71,7 @@ def generate_balance_sheet(api_key, balance_sheet, net_profit):
     Your task is to create a formal balance sheet using the JSON data provided. The JSON contains categorized financial data including assets, liabilities, equity, and their respective totals.
 
     **Input Data:**
-    {json.dumps(financial_data, indent=2)}
+    {json.dumps(financial_data, indent=2, ensure_ascii=False)}
 
     **Output Requirements:**
     Generate a clear, properly formatted balance sheet with the following specifications:
@@ -73,29 +80,29 @@ def generate_balance_sheet(api_key, balance_sheet, net_profit):
     - Present assets on the right side and liabilities & equity on the left side
     - Group accounts by type (current assets, current liabilities, equity)
     - Include subtotals for each group and grand totals
-    - Format all currency values in Indian Rupees (₹)
+    - Format all currency values in {currency} ({label})
     - Ensure that Total Assets equals Total Liabilities & Equity
 
     **📊 Balance Sheet Format**
                                                BALANCE SHEET
 
 
-| **Liabilities & Equity**            | **Amount (₹)** | **Assets**                         | **Amount (₹)** |
+| **Liabilities & Equity**            | **Amount ({label})** | **Assets**                         | **Amount ({label})** |
 |-------------------------------------|----------------|------------------------------------|----------------|
 | **Current Liabilities**             |                | **Current Assets**                 |                |
-| Short-Term Liability 1              | ₹[Value]       | Current Asset 1                    | ₹[Value]       |
-| Short-Term Liability 2              | ₹[Value]       | Current Asset 2                    | ₹[Value]       |
-| **Total Current Liabilities**       | ₹[Total]       | **Total Current Assets**           | ₹[Total]       |
+| Short-Term Liability 1              | {symbol}[Value]       | Current Asset 1                    | {symbol}[Value]       |
+| Short-Term Liability 2              | {symbol}[Value]       | Current Asset 2                    | {symbol}[Value]       |
+| **Total Current Liabilities**       | {symbol}[Total]       | **Total Current Assets**           | {symbol}[Total]       |
 | **Non-Current Liabilities**         |                | **Non-Current Assets**             |                |
-| Non-Current Liability 1             | ₹[Value]       | Non-Current Asset 1                | ₹[Value]       |
-| NOn-current Liability 2             | ₹[Value]       | Non-Current Asset 2                | ₹[Value]       |
-| **Total Non-Current Liabilities**   | ₹[Total]       | **Total Non-Current Assets**       | ₹[Total]       |
-| **Total Liabilities**               | ₹[Total]       | **Total Assets**                   | ₹[Total]       |
+| Non-Current Liability 1             | {symbol}[Value]       | Non-Current Asset 1                | {symbol}[Value]       |
+| NOn-current Liability 2             | {symbol}[Value]       | Non-Current Asset 2                | {symbol}[Value]       |
+| **Total Non-Current Liabilities**   | {symbol}[Total]       | **Total Non-Current Assets**       | {symbol}[Total]       |
+| **Total Liabilities**               | {symbol}[Total]       | **Total Assets**                   | {symbol}[Total]       |
 | **Equity**                          |                |                                    |                |
-| Owner's Equity                      | ₹[Value]       |                                    |                |
-| Retained Earnings                   | ₹[Value]       |                                    |                |
-| Net Profit                          | ₹[Value]       |                                    |                |
-| **Total Liabilities & Equity**      | ₹[Total]       | **Total Assets**                   | ₹[Total]       |
+| Owner's Equity                      | {symbol}[Value]       |                                    |                |
+| Retained Earnings                   | {symbol}[Value]       |                                    |                |
+| Net Profit                          | {symbol}[Value]       |                                    |                |
+| **Total Liabilities & Equity**      | {symbol}[Total]       | **Total Assets**                   | {symbol}[Total]       |
 
 
     Note: " Total liabilities & equity should be equal to Total Assests"
@@ -108,15 +115,13 @@ def generate_balance_sheet(api_key, balance_sheet, net_profit):
     - Verify that the final balance sheet balances (total assets = total liabilities + total equity). **important requirement**
     - If non-current assets or non-current liabilities exist in the input, include them in the appropriate sections of the balance sheet.
     - Format currency values consistently (e.g., with commas as thousand separators).
+    {"" if include_explanation else NO_EXPLANATION_RULE}
 
     Please generate the balance sheet based on the provided JSON data following these specifications.
     """
 
     # Send the prompt to the Mistral model
-    response = client.chat.complete(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    response = complete_chat(api_key, "balance_sheet", prompt)
     
     # Extract and return the generated balance sheet
     balance_sheet = response.choices[0].message.content
@@ -126,6 +131,31 @@ def generate_balance_sheet(api_key, balance_sheet, net_profit):
     return balance_sheet
 
 
+def explain_balance_sheet(api_key, bs_statement):
+    """
+    Generates the narrative explanation for an already generated balance sheet.
+
+    Parameters:
+    - api_key (str): Mistral API key.
+    - bs_statement (str): Statement returned by generate_balance_sheet.
+
+    Returns:
+    - str: The explanation in markdown.
+    """
+    prompt = f"""
+    Explain the following balance sheet to a finance reviewer.
+
+    {bs_statement}
+
+    - Describe the composition of assets, liabilities and equity, including liquidity (current vs non-current).
+    - State whether total assets equal total liabilities and equity, and call out any difference.
+    - Use short markdown paragraphs or bullet points, at most 200 words. Do not repeat the table.
+    """
+    response = complete_chat(api_key, "explain", prompt)
+    print("✅ Generated Balance Sheet explanation.")
+    return response.choices[0].message.content
+
+
 
 
 # if __name__ == "__main__":
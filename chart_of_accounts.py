@@ -0,0 +1,165 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from money import to_minor, from_minor
+from reconcile import CATEGORIES
+
+
+PREFIX_DIGITS = 4
+MAX_EXACT_INTEGER = 2 ** 53
+_POWERS_OF_TEN = 10 ** np.arange(16, dtype=np.int64)
+
+# start, end (inclusive, on the leading PREFIX_DIGITS digits), category, sub_category
+DEFAULT_RANGES = [
+    (1000, 1499, "assets", "current"),
+    (1500, 1999, "assets", "non_current"),
+    (2000, 2499, "liabilities", "current"),
+    (2500, 2999, "liabilities", "non_current"),
+    (3000, 3999, "equity", "equity"),
+    (4000, 4799, "revenue", "operating"),
+    (4800, 4999, "revenue", "other"),
+    (5000, 6799, "expenses", "operating"),
+    (6800, 6999, "expenses", "other"),
+]
+
+
+class ChartOfAccounts:
+    """
+    Deterministic account classification from a table of numeric account-number ranges.
+
+    Account numbers are compared on their leading prefix_digits digits, so "1001" and
+    "10010000" both fall in the 1000-1499 range. Lookup is a single np.searchsorted over
+    the sorted range starts, vectorized across the whole ledger.
+
+    Parameters:
+    - ranges (list): (start, end, category, sub_category) tuples. Ranges must not overlap and
+      category must be one of reconcile.CATEGORIES.
+    - prefix_digits (int): Number of leading digits of the account number matched against ranges.
+    """
+
+    def __init__(self, ranges=None, prefix_digits=PREFIX_DIGITS):
+        ranges = sorted(ranges or DEFAULT_RANGES, key=lambda r: int(r[0]))
+        self.prefix_digits = prefix_digits
+        self.starts = np.array([int(r[0]) for r in ranges], dtype=np.int64)
+        self.ends = np.array([int(r[1]) for r in ranges], dtype=np.int64)
+        self.categories = np.array([r[2] for r in ranges], dtype=object)
+        self.sub_categories = np.array([r[3] for r in ranges], dtype=object)
+
+        unknown = sorted({str(c) for c in self.categories} - set(CATEGORIES))
+        if unknown:
+            raise ValueError(f"Chart of accounts has unknown categories: {', '.join(unknown)} "
+                             f"(expected one of {', '.join(CATEGORIES)}).")
+        if np.any(self.ends < self.starts):
+            raise ValueError("Chart of accounts range has end before start.")
+        if np.any(self.starts[1:] <= self.ends[:-1]):
+            raise ValueError("Chart of accounts ranges overlap.")
+
+    @classmethod
+    def from_file(cls, path, prefix_digits=PREFIX_DIGITS):
+        """Loads ranges from a CSV or JSON file with start, end, category, sub_category fields."""
+        if path.endswith(".csv"):
+            records = pd.read_csv(path).to_dict(orient="records")
+        elif path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                records = json.load(f)
+        else:
+            raise ValueError("Chart of accounts must be a CSV or JSON file.")
+        ranges = [
+            (r["start"], r["end"], str(r["category"]).lower(),
+             r["sub_category"] if pd.notna(r.get("sub_category")) else "")
+            for r in records
+        ]
+        return cls(ranges, prefix_digits)
+
+    @classmethod
+    def from_env(cls):
+        """Uses the CHART_OF_ACCOUNTS file if set, otherwise the default ranges."""
+        path = os.getenv("CHART_OF_ACCOUNTS")
+        return cls.from_file(path) if path else cls()
+
+    def account_prefixes(self, account_numbers):
+        """
+        Leading prefix_digits digits of each account number as int64, -1 where there are none.
+
+        Non-digits are stripped and the remaining digit string is cut or right-padded with zeros
+        to prefix_digits, so leading zeros count ("0123" -> 0123, "A/C 1001" -> 1001).
+        """
+        series = pd.Series(account_numbers)
+        prefixes = np.full(len(series), -1, dtype=np.int64)
+
+        # Fast path: plain positive integers below 2**53 (exact in float64) are scaled
+        # arithmetically. Strings only qualify if they are bare digits without a leading zero.
+        numbers = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            numeric = np.isfinite(numbers) & (numbers >= 1) & (numbers < MAX_EXACT_INTEGER) & \
+                (numbers == np.floor(numbers))
+        if not pd.api.types.is_numeric_dtype(series) and numeric.any():
+            text = series[numeric].astype(str).str.strip()
+            numeric[numeric] = (text.str.isdigit() & ~text.str.startswith("0")).to_numpy(dtype=bool)
+
+        values = numbers[numeric].astype(np.int64)
+        n_digits = np.searchsorted(_POWERS_OF_TEN, values, side="right")
+        shift = n_digits - self.prefix_digits
+        prefixes[numeric] = np.where(
+            shift >= 0, values // _POWERS_OF_TEN[np.maximum(shift, 0)], values * _POWERS_OF_TEN[np.maximum(-shift, 0)])
+
+        # Same rule on the digit string for the rest, e.g. "YCOA/10010000", "A/C 0123" or 20-digit numbers
+        if not numeric.all():
+            rest = series[~numeric].astype("string").str.replace(r"\D", "", regex=True)
+            prefix = rest.str[:self.prefix_digits].str.ljust(self.prefix_digits, "0")
+            prefixes[~numeric] = pd.to_numeric(
+                prefix.where(rest.str.len() > 0), errors="coerce").fillna(-1).astype(np.int64).to_numpy()
+        return prefixes
+
+    def lookup(self, account_numbers):
+        """
+        Classifies account numbers in one vectorized pass.
+
+        Returns:
+        - tuple: (category, sub_category, matched) numpy arrays; unmatched rows have None values.
+        """
+        prefixes = self.account_prefixes(account_numbers)
+        idx = np.searchsorted(self.starts, prefixes, side="right") - 1
+        safe_idx = np.clip(idx, 0, len(self.starts) - 1)
+        matched = (idx >= 0) & (prefixes >= 0) & (prefixes <= self.ends[safe_idx])
+        category = np.where(matched, self.categories[safe_idx], None)
+        sub_category = np.where(matched, self.sub_categories[safe_idx], None)
+        return category, sub_category, matched
+
+
+def classify_by_chart(ledger, chart=None):
+    """
+    Classifies the ledger rows that fall in a chart-of-accounts range and returns the rest.
+
+    Parameters:
+    - ledger (DataFrame): Cleaned ledger with account_number, account_name, closing_balance columns
+    - chart (ChartOfAccounts): Range table. Defaults to ChartOfAccounts.from_env().
+
+    Returns:
+    - tuple: (classified dict keyed by category, DataFrame of unmatched rows for the LLM)
+    """
+    chart = chart or ChartOfAccounts.from_env()
+    category, sub_category, matched = chart.lookup(ledger["account_number"])
+
+    hits = ledger[matched]
+    if "closing_balance_minor" in hits.columns:
+        balance_minor = hits["closing_balance_minor"].to_numpy(dtype=np.int64)
+    else:
+        balance_minor = to_minor(hits["closing_balance"])
+    entries = pd.DataFrame({
+        "accountNumber": hits["account_number"].astype(str).to_numpy(),
+        "accountName": hits["account_name"].astype(str).to_numpy(),
+        "amount": from_minor(np.abs(balance_minor)),
+        "balanceType": np.where(balance_minor < 0, "Cr.", "Dr."),
+        "subCategory": sub_category[matched],
+        "category": category[matched],
+    })
+
+    classified = {
+        name: group.drop(columns="category").to_dict(orient="records")
+        for name, group in entries.groupby("category", sort=False)
+    }
+    print(f"✅ Chart of accounts classified {int(matched.sum())} of {len(ledger)} accounts; "
+          f"{int((~matched).sum())} left for the LLM.")
+    return classified, ledger[~matched]
@@ -1,24 +1,61 @@
 import pandas as pd
 import json
 import re
-from mistralai import Mistral
+from model_router import complete_chat
 from extract import extract_account_fields_from_file, clean_with_llm
 from auditor import process_accounts_from_excel
+from chart_of_accounts import classify_by_chart
+from memory_budget import ledger_to_frame
+from reconcile import CATEGORIES, classified_totals
+from money import to_minor
 
 
 
-def classify_trial_balance(api_key, cleaned_json):
+def classify_trial_balance(api_key, cleaned_json, json_file="trial_balance.json", chart=None):
     """
-    This function reads a trial balance file, processes the data using process_accounts_from_excel, and then uses the Mistral LLM to classify accounts into the five fundamental accounting categories: Assets, Liabilities, Equity, Expenses, and Revenue.
+    Classifies the cleaned trial balance into the five fundamental accounting categories: Assets, Liabilities, Equity, Expenses, and Revenue.
+
+    Accounts whose number falls in a chart-of-accounts range are classified deterministically
+    (see chart_of_accounts.py); only the remaining accounts are sent to the LLM.
+
+    Parameters:
+    - api_key (str): Mistral API key.
+    - cleaned_json (list | SpilledLedger): Ledger returned by clean_with_llm.
+    - json_file (str): Where the LLM-bound trial balance is saved; use a per-run path when
+      several classifications can run at once.
+    - chart (ChartOfAccounts): Range table, defaults to ChartOfAccounts.from_env().
+
+    Returns:
+    - str: Classified JSON string with one list per category, a totals section in rupees and
+      the same totals as int paise in totals_minor.
     """
-    model = "mistral-small-latest"
-    client = Mistral(api_key=api_key)
+    ledger = ledger_to_frame(cleaned_json)
+    if ledger.empty:
+        rule_classified, unmatched = {}, ledger
+    else:
+        rule_classified, unmatched = classify_by_chart(ledger, chart)
+
+    llm_classified = {}
+    if not unmatched.empty:
+        llm_classified = json.loads(
+            _classify_with_llm(api_key, unmatched.to_dict(orient="records"), json_file))
 
+    categorized_data = {
+        category: rule_classified.get(category, []) + (llm_classified.get(category) or [])
+        for category in CATEGORIES
+    }
+    categorized_data["totals"], categorized_data["totals_minor"] = classified_totals(categorized_data)
+    return json.dumps(categorized_data, indent=4)
+
+
+def _classify_with_llm(api_key, cleaned_json, json_file):
+    """
+    This function processes the data using process_accounts_from_excel, and then uses the Mistral LLM to classify accounts into the five fundamental accounting categories: Assets, Liabilities, Equity, Expenses, and Revenue.
+    """
     # Step 1: Process trial balance file using the provided function
     trial_balance_json = process_accounts_from_excel(cleaned_json, api_key)
 
     # Step 2: Save JSON for reference
-    json_file = "trial_balance.json"
     with open(json_file, "w") as f:
         json.dump(trial_balance_json, f, indent=4)
 
@@ -118,10 +155,7 @@ def classify_trial_balance(api_key, cleaned_json):
     """
 
     # Step 4: Send request to Mistral LLM
-    chat_response = client.chat.complete(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-    )
+    chat_response = complete_chat(api_key, "classify", prompt)
 
     # Extract response text
     response_text = chat_response.choices[0].message.content
@@ -165,6 +199,10 @@ def segregate_financial_statements(classified_json_str):
         print("❌ Failed to parse classified JSON:", e)
         return None, None
 
+    # Exact paise totals; derived from the rupee totals for classifications without them
+    totals_minor = classified_data.get("totals_minor") or {
+        name: to_minor(value) for name, value in classified_data.get("totals", {}).items()}
+
     # Extract relevant parts
     balance_sheet = {
         "assets": classified_data.get("assets", []),
@@ -174,7 +212,8 @@ def segregate_financial_statements(classified_json_str):
             "assets": classified_data.get("totals", {}).get("assets", 0),
             "liabilities": classified_data.get("totals", {}).get("liabilities", 0),
             "equity": classified_data.get("totals", {}).get("equity", 0)
-        }
+        },
+        "totals_minor": {name: totals_minor.get(name, 0) for name in ("assets", "liabilities", "equity")},
     }
 
     profit_and_loss = {
@@ -183,7 +222,8 @@ def segregate_financial_statements(classified_json_str):
         "totals": {
             "expenses": classified_data.get("totals", {}).get("expenses", 0),
             "revenue": classified_data.get("totals", {}).get("revenue", 0)
-        }
+        },
+        "totals_minor": {name: totals_minor.get(name, 0) for name in ("expenses", "revenue")},
     }
 
     # Convert both to JSON strings
@@ -0,0 +1,153 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from money import to_minor, from_minor, parse_major
+
+
+DEFAULT_REPORTING_CURRENCY = "INR"
+
+CURRENCY_SYMBOLS = {
+    "₹": "INR",
+    "Rs": "INR",
+    "$": "USD",
+    "€": "EUR",
+    "£": "GBP",
+    "¥": "JPY",
+}
+_SYMBOL_PATTERN = r"₹|Rs\.?|\$|€|£|¥"
+# Preferred symbol per code for rendering; codes without one are written as "USD 1,000.00"
+RENDER_SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
+
+def reporting_currency():
+    return os.getenv("REPORTING_CURRENCY", DEFAULT_REPORTING_CURRENCY).upper()
+
+
+def currency_symbol(code=None):
+    """Symbol used to render amounts in code (the reporting currency by default)."""
+    code = (code or reporting_currency()).upper()
+    return RENDER_SYMBOLS.get(code, f"{code} ")
+
+
+def known_currencies(rates=None, reporting=None):
+    """ISO codes accepted by detect_currency: the symbol map, the FX rate table and the reporting currency."""
+    rates = load_fx_rates() if rates is None else rates
+    return set(CURRENCY_SYMBOLS.values()) | set(rates["currency"]) | {reporting or reporting_currency()}
+
+
+def detect_currency(values, default=None, known=None):
+    """
+    Detects the currency of each raw balance (e.g. "$1,000.50", "EUR 250", "₹ 75") with one
+    vectorized regex pass. Three-letter codes only count when they are known ISO codes, so
+    text such as "NIL" is not mistaken for a currency. Values without a marker get the
+    default currency.
+
+    Parameters:
+    - values (Series | list): Raw closing balance values as read from the file.
+    - default (str): Currency for unmarked values. Defaults to the reporting currency.
+    - known (set): Accepted ISO codes. Defaults to known_currencies().
+
+    Returns:
+    - Series: Categorical ISO currency codes.
+    """
+    default = default or reporting_currency()
+    known = known_currencies(reporting=default) if known is None else set(known) | {default}
+    codes_pattern = "|".join(sorted(re.escape(c) for c in known))
+    pattern = f"({_SYMBOL_PATTERN}|\\b(?:{codes_pattern})\\b)"
+    marker = pd.Series(values).astype("string").str.extract(pattern, expand=False)
+    marker = marker.str.rstrip(".")
+    codes = marker.map(lambda m: CURRENCY_SYMBOLS.get(m, m), na_action="ignore").fillna(default)
+    return codes.astype(str).astype("category")
+
+
+def load_fx_rates(path=None):
+    """
+    Loads an FX rate table from CSV or JSON with currency, date and rate fields, where rate is
+    the number of reporting-currency units per one unit of currency on that date.
+
+    Parameters:
+    - path (str): Table path. Defaults to the FX_RATES environment variable.
+
+    Returns:
+    - DataFrame: currency, date, rate sorted by date. Empty if no table is configured.
+    """
+    path = path or os.getenv("FX_RATES")
+    if not path:
+        return pd.DataFrame({"currency": pd.Series(dtype=str), "date": pd.Series(dtype="datetime64[ns]"),
+                             "rate": pd.Series(dtype=float)})
+
+    if path.endswith(".csv"):
+        rates = pd.read_csv(path)
+    elif path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            rates = pd.DataFrame(json.load(f))
+    else:
+        raise ValueError("FX rate table must be a CSV or JSON file.")
+
+    missing = {"currency", "date", "rate"} - set(rates.columns)
+    if missing:
+        raise ValueError(f"FX rate table is missing columns: {', '.join(sorted(missing))}")
+
+    rates = rates.assign(
+        currency=rates["currency"].astype(str).str.strip().str.upper(),
+        date=pd.to_datetime(rates["date"]),
+        rate=pd.to_numeric(rates["rate"], errors="raise"),
+    )
+    return rates.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def rates_as_of(rates, as_of=None, reporting=None):
+    """Latest rate per currency on or before as_of (all dates if None); reporting currency is 1."""
+    reporting = reporting or reporting_currency()
+    if as_of is not None:
+        rates = rates[rates["date"] <= pd.Timestamp(as_of)]
+    latest = rates.drop_duplicates("currency", keep="last")[["currency", "date", "rate"]]
+    latest = latest[latest["currency"] != reporting]
+    identity = pd.DataFrame({"currency": [reporting], "date": [pd.NaT], "rate": [1.0]})
+    return pd.concat([identity, latest], ignore_index=True)
+
+
+def convert_to_reporting(ledger, rates=None, as_of=None, reporting=None):
+    """
+    Converts every closing balance to the reporting currency with a join on currency and one
+    vectorized multiply. The original amount, currency and applied rate are kept alongside.
+
+    Parameters:
+    - ledger (DataFrame): Cleaned ledger with closing_balance and currency columns.
+    - rates (DataFrame): Output of load_fx_rates. Defaults to the FX_RATES table.
+    - as_of (str | date): Statement date used to pick rates. Latest available if omitted.
+    - reporting (str): Reporting currency. Defaults to REPORTING_CURRENCY or INR.
+
+    Returns:
+    - DataFrame: ledger with closing_balance in reporting currency, the same amount as int64
+      paise in closing_balance_minor, plus original_balance, currency and fx_rate columns.
+    """
+    reporting = reporting or reporting_currency()
+    if "currency" not in ledger.columns:
+        ledger = ledger.assign(currency=reporting)
+    rates = load_fx_rates() if rates is None else rates
+    table = rates_as_of(rates, as_of, reporting)[["currency", "rate"]]
+
+    ledger = ledger.assign(currency=ledger["currency"].astype(str))
+    merged = ledger.merge(table, on="currency", how="left")
+
+    unknown = merged.loc[merged["rate"].isna(), "currency"].unique().tolist()
+    if unknown:
+        raise ValueError(f"No FX rate to {reporting} for: {', '.join(sorted(unknown))}")
+
+    # Separators are handled and non-numeric balances raise, rather than silently becoming 0
+    original = np.nan_to_num(parse_major(merged["closing_balance"]), nan=0.0)
+    minor = to_minor(original * merged["rate"].to_numpy())
+    converted = merged.assign(
+        original_balance=original,
+        closing_balance=from_minor(minor),
+        closing_balance_minor=minor,
+        currency=merged["currency"].astype("category"),
+    ).rename(columns={"rate": "fx_rate"})
+
+    foreign = int((converted["currency"] != reporting).sum())
+    if foreign:
+        print(f"✅ Converted {foreign} foreign-currency balance(s) to {reporting}.")
+    return converted
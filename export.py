@@ -0,0 +1,245 @@
+import io
+import json
+import os
+import re
+import sys
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+
+CATEGORIES = ["assets", "liabilities", "equity", "revenue", "expenses"]
+LEDGER_HEADER = ["Category", "Account Number", "Account Name", "Amount", "Balance Type"]
+AMOUNT_FORMAT = "#,##0.00"
+
+_HEADER_FONT = Font(bold=True, color="FFFFFF")
+_HEADER_FILL = PatternFill("solid", fgColor="1F4E78")
+_BOLD_FONT = Font(bold=True)
+_SEPARATOR_ROW = re.compile(r"^\|?\s*:?-{3,}")
+_AMOUNT_TEXT = re.compile(r"^\(?-?(?P<symbol>[₹$€£¥]|[A-Z]{3}\b)?\s*-?[\d,]+(?P<decimals>\.\d+)?\)?$")
+
+
+def _header_row(ws, values):
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = _HEADER_FONT
+        cell.fill = _HEADER_FILL
+        row.append(cell)
+    return row
+
+
+def _amount_cell(ws, value, bold=False):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.number_format = AMOUNT_FORMAT
+    if bold:
+        cell.font = _BOLD_FONT
+    return cell
+
+
+def _parse_amount(text, amount_column=False):
+    """
+    Converts a rendered amount such as '₹1,234.50' or '(₹100.00)' to a float, else None.
+
+    Bare integers such as account numbers or years ('4001', '2023') are left as text unless
+    the cell sits in a column whose header mentions an amount.
+    """
+    text = text.replace("*", "").strip()
+    match = _AMOUNT_TEXT.match(text) if text else None
+    if not match or not (amount_column or match.group("symbol") or match.group("decimals")):
+        return None
+    negative = text.startswith("(") or "-" in text
+    digits = re.sub(r"[^\d.]", "", text)
+    if not digits:
+        return None
+    value = float(digits)
+    return -value if negative else value
+
+
+def _iter_table_lines(markdown_text):
+    body = re.split(r"(?:#+\s*)?Explanation:", markdown_text or "")[0]
+    rows = []
+    for line in body.splitlines():
+        line = line.strip()
+        if not line.startswith("|"):
+            continue
+        if _SEPARATOR_ROW.match(line):
+            # The row just before a separator is a table header
+            if rows:
+                rows[-1] = (rows[-1][0], True)
+            continue
+        cells = [c.strip() for c in line.strip("|").split("|")]
+        rows.append(([(c.replace("**", "").strip(), "**" in c) for c in cells], False))
+    return rows
+
+
+def iter_markdown_table_rows(markdown_text):
+    """
+    Yields the cell values of every markdown table row in an LLM statement, skipping
+    separator lines. The narrative after "Explanation:" is ignored.
+
+    Parameters:
+    - markdown_text (str): Statement text returned by the P&L or balance sheet generator.
+
+    Yields:
+    - list: (text, is_bold) tuples, one per cell.
+    """
+    for cells, _ in _iter_table_lines(markdown_text):
+        yield cells
+
+
+def _write_statement_sheet(wb, title, markdown_text):
+    ws = wb.create_sheet(title=title)
+    ws.column_dimensions["A"].width = 40
+    ws.column_dimensions["B"].width = 18
+    ws.column_dimensions["C"].width = 40
+    ws.column_dimensions["D"].width = 18
+
+    amount_columns = set()
+    for cells, is_header in _iter_table_lines(markdown_text):
+        if is_header:
+            amount_columns = {i for i, (text, _) in enumerate(cells) if "amount" in text.lower()}
+        row = []
+        for i, (text, bold) in enumerate(cells):
+            amount = _parse_amount(text, i in amount_columns)
+            if amount is not None:
+                row.append(_amount_cell(ws, amount, bold))
+            else:
+                cell = WriteOnlyCell(ws, value=text)
+                if bold:
+                    cell.font = _BOLD_FONT
+                row.append(cell)
+        ws.append(row)
+
+
+def iter_ledger_rows(classified):
+    """
+    Yields one row per classified account without materialising a flattened copy of the ledger.
+
+    Parameters:
+    - classified (str | dict): JSON string returned from classify_trial_balance, or the parsed dict.
+
+    Yields:
+    - list: [category, account number, account name, amount, balance type]
+    """
+    if isinstance(classified, str):
+        classified = json.loads(classified)
+    for category in CATEGORIES:
+        for entry in classified.get(category, []) or []:
+            yield [
+                category.capitalize(),
+                str(entry.get("accountNumber", "")),
+                entry.get("accountName", ""),
+                entry.get("amount", 0),
+                entry.get("balanceType", ""),
+            ]
+
+
+def _write_ledger_sheet(wb, classified):
+    ws = wb.create_sheet(title="Classified Ledger")
+    ws.column_dimensions["A"].width = 14
+    ws.column_dimensions["B"].width = 18
+    ws.column_dimensions["C"].width = 40
+    ws.column_dimensions["D"].width = 18
+    ws.column_dimensions["E"].width = 14
+    ws.freeze_panes = "A2"
+
+    ws.append(_header_row(ws, LEDGER_HEADER))
+    for category, number, name, amount, balance_type in iter_ledger_rows(classified):
+        ws.append([category, number, name, _amount_cell(ws, amount), balance_type])
+
+
+def export_statements_to_xlsx(target, classified, pnl_statement=None, bs_statement=None):
+    """
+    Writes the classified ledger, the P&L and the balance sheet to a formatted XLSX workbook.
+
+    The workbook is built in openpyxl write-only mode, so rows are streamed to the target
+    as they are produced and memory stays flat regardless of ledger size.
+
+    Parameters:
+    - target (str | file-like): Output path or a binary buffer (e.g. io.BytesIO).
+    - classified (str | dict): JSON string returned from classify_trial_balance.
+    - pnl_statement (str): Markdown P&L returned by generate_profit_and_loss_statement.
+    - bs_statement (str): Markdown balance sheet returned by generate_balance_sheet.
+
+    Returns:
+    - str | file-like: The target that was written.
+    """
+    wb = Workbook(write_only=True)
+    _write_ledger_sheet(wb, classified)
+    if pnl_statement:
+        _write_statement_sheet(wb, "Profit & Loss", pnl_statement)
+    if bs_statement:
+        _write_statement_sheet(wb, "Balance Sheet", bs_statement)
+    wb.save(target)
+
+    print("✅ Exported financial statements to XLSX.")
+    return target
+
+
+def export_statements_to_bytes(classified, pnl_statement=None, bs_statement=None):
+    """
+    Same as export_statements_to_xlsx but returns the workbook as bytes, for download buttons.
+    """
+    buffer = io.BytesIO()
+    export_statements_to_xlsx(buffer, classified, pnl_statement, bs_statement)
+    return buffer.getvalue()
+
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_run_outputs(path):
+    """
+    Loads the classified ledger and statements of a finished run for a batch export.
+
+    Parameters:
+    - path (str): One of
+      - an artifact store directory (<store>/<key>) with reconciled.json, profit_and_loss.json
+        and balance_sheet.json,
+      - a service result (GET /jobs/<id>/result) saved as JSON,
+      - a store's reconciled.json ([classified, report]),
+      - a classified JSON as returned by classify_trial_balance.
+
+    Returns:
+    - tuple: (classified, pnl_statement or None, bs_statement or None)
+    """
+    if os.path.isdir(path):
+        def artifact(name):
+            artifact_path = os.path.join(path, f"{name}.json")
+            return _read_json(artifact_path) if os.path.exists(artifact_path) else None
+
+        reconciled = artifact("reconciled")
+        if reconciled is None:
+            raise ValueError(f"No reconciled classification in {path}; the run did not finish or failed reconciliation.")
+        pnl = artifact("profit_and_loss")
+        return reconciled[0], pnl[0] if pnl else None, artifact("balance_sheet")
+
+    data = _read_json(path)
+    if isinstance(data, dict) and "classified" in data:
+        return data["classified"], data.get("pnl_statement"), data.get("bs_statement")
+    if isinstance(data, list) and len(data) == 2 and isinstance(data[1], dict) and "checks" in data[1]:
+        return data[0], None, None
+    if isinstance(data, dict):
+        return data, None, None
+    raise ValueError(f"Unrecognised run output: {path}")
+
+
+# Batch usage:
+#   python export.py <store dir | result.json | reconciled.json | classified.json> statements.xlsx [pnl.md] [balance_sheet.md]
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: python export.py <run> <output.xlsx> [pnl.md] [balance_sheet.md]\n"
+                 "  <run> is an artifact store directory (.artifacts/<key>), a saved service result,\n"
+                 "  a store's reconciled.json or a classified JSON")
+
+    def _read(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    classified_json, pnl_md, bs_md = load_run_outputs(sys.argv[1])
+    pnl_md = _read(sys.argv[3]) if len(sys.argv) > 3 else pnl_md
+    bs_md = _read(sys.argv[4]) if len(sys.argv) > 4 else bs_md
+    export_statements_to_xlsx(sys.argv[2], classified_json, pnl_md, bs_md)
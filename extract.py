@@ -1,28 +1,136 @@
-from mistralai import Mistral
+from model_router import complete_chat
+from openpyxl import load_workbook
+from currency import detect_currency
 import pandas as pd
+import csv
+import itertools
 import json
 import re
 
 
-def extract_account_fields_from_file(file_path, api_key):
+PROBE_SCAN_ROWS = 20
+PROBE_SAMPLE_ROWS = 2
+
+
+def _read_leading_rows(file_path, max_rows):
+    """Reads at most max_rows raw rows (no header inference) from the top of the file."""
+    if file_path.endswith(".csv"):
+        # csv.reader rather than pd.read_csv: banner rows are narrower than the table
+        with open(file_path, newline="", encoding="utf-8-sig", errors="replace") as f:
+            return [[v if v != "" else None for v in row]
+                    for row in itertools.islice(csv.reader(f), max_rows)]
+    elif file_path.endswith(".xlsx"):
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            # First sheet, as pd.read_excel in _read_table reads it; not whichever sheet was active on save
+            return [list(row) for row in wb.worksheets[0].iter_rows(max_row=max_rows, values_only=True)]
+        finally:
+            wb.close()
+    elif file_path.endswith(".xls"):
+        df = pd.read_excel(file_path, header=None, nrows=max_rows)
+        return df.where(df.notna(), None).values.tolist()
+    else:
+        raise ValueError("Only CSV and Excel files are supported.")
+
+
+def _is_label(value):
+    if value is None or isinstance(value, (int, float)):
+        return False
+    text = str(value).strip()
+    if not text:
+        return False
     try:
-        # Step 1: Read file
-        if file_path.endswith(".csv"):
-            df = pd.read_csv(file_path)
-        elif file_path.endswith((".xlsx", ".xls")):
-            df = pd.read_excel(file_path)
+        float(text.replace(",", ""))
+        return False
+    except ValueError:
+        return True
+
+
+def probe_table(file_path, sample_rows=PROBE_SAMPLE_ROWS, scan_rows=PROBE_SCAN_ROWS):
+    """
+    Reads only the top of a CSV/Excel file to find the header row and a few data rows,
+    so column detection does not depend on the size of the file.
+
+    The header is taken to be the first row, within the scanned rows, whose non-empty
+    cells are all text labels and which is as wide as the widest row seen. Banner rows
+    above the table (report titles, company names, dates) are skipped this way.
+
+    Parameters:
+    - file_path (str): Path to the Excel or CSV file
+    - sample_rows (int): Number of data rows to return after the header
+    - scan_rows (int): Number of leading rows searched for the header
+
+    Returns:
+    - tuple: (header_row_index, column_names, data_rows)
+    """
+    rows = _read_leading_rows(file_path, scan_rows + sample_rows)
+    scanned = rows[:scan_rows]
+
+    def width(row):
+        return sum(1 for v in row if v is not None and str(v).strip() != "")
+
+    max_width = max((width(r) for r in scanned), default=0)
+    header_idx = 0
+    for idx, row in enumerate(scanned):
+        cells = [v for v in row if v is not None and str(v).strip() != ""]
+        if cells and len(cells) == max_width and all(_is_label(v) for v in cells):
+            header_idx = idx
+            break
+
+    header = rows[header_idx] if rows else []
+    # Deduplicate names the same way pandas does ("G/L Account", "G/L Account.1", ...)
+    column_names, seen = [], {}
+    for i, name in enumerate(header):
+        name = str(name).strip() if name is not None else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
         else:
-            raise ValueError("Only CSV and Excel files are supported.")
+            seen[name] = 0
+        column_names.append(name)
+
+    data_rows = [r for r in rows[header_idx + 1:] if width(r)][:sample_rows]
+    return header_idx, column_names, data_rows
+
 
-        # Step 2: Get column names and sample data
-        column_names = df.columns.tolist()
-        data_rows = df.head(2).values.tolist()
+def _read_table(file_path, header_row=0):
+    # skiprows counts physical lines, matching the index returned by probe_table
+    if file_path.endswith(".csv"):
+        return pd.read_csv(file_path, skiprows=header_row)
+    elif file_path.endswith((".xlsx", ".xls")):
+        return pd.read_excel(file_path, skiprows=header_row)
+    else:
+        raise ValueError("Only CSV and Excel files are supported.")
+
+
+def _attach_currency(cleaned_list, df, account_col, balance_col):
+    """Adds the currency detected from the raw balance column to each cleaned row."""
+    currencies = detect_currency(df[balance_col])
+    if len(cleaned_list) == len(df):
+        for record, code in zip(cleaned_list, currencies):
+            record["currency"] = code
+        return cleaned_list
+
+    # Row count changed in the LLM; match on the digits of the account number instead
+    digits = df[account_col].astype(str).str.replace(r"\D", "", regex=True)
+    by_account = dict(zip(digits, currencies))
+    default = detect_currency([None]).iloc[0]
+    for record in cleaned_list:
+        key = re.sub(r"\D", "", str(record.get("account_number", "")))
+        record["currency"] = by_account.get(key, default)
+    return cleaned_list
+
+
+def extract_account_fields_from_file(file_path, api_key):
+    try:
+        # Step 1 & 2: Probe the header and a couple of data rows without parsing the whole file
+        header_row, column_names, data_rows = probe_table(file_path)
         table_sample = [dict(zip(column_names, row)) for row in data_rows]
 
         # Step 3: Build prompt
         prompt = f"""
 You are given a table with the following column names and 2 rows of data:
-{json.dumps(table_sample, indent=2)}
+{json.dumps(table_sample, indent=2, default=str)}
 
 Your task is to identify:
 1. Which column contains the **Account Number**
@@ -53,13 +161,7 @@ Return the answer strictly in the following JSON format:
 """
 
         # Step 4: Call Mistral LLM
-        model = "mistral-small-latest"
-        client = Mistral(api_key=api_key)
-
-        chat_response = client.chat.complete(
-            model=model,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        chat_response = complete_chat(api_key, "detect_columns", prompt)
 
         response_text = chat_response.choices[0].message.content.strip()
 
@@ -68,6 +170,7 @@ Return the answer strictly in the following JSON format:
         if json_match:
             try:
                 extract =  json.loads(json_match.group())
+                extract["header_row"] = header_row
                 print("✅ 1. Successfully identified columns from give file.")
                 return extract
                 
@@ -108,19 +211,16 @@ def clean_with_llm(file_path, extracted_columns, api_key):
     Args:
         file_path (str): Path to the Excel or CSV file
         extracted_columns (dict): Dict with 'account_number_column', 'account_name_column', 'closing_balance_column'
+            and optionally 'header_row' (index of the header line, as found by probe_table)
         api_key (str): API key for the LLM
 
     Returns:
-        list: List of dicts, each representing a cleaned row
+        list: List of dicts, each representing a cleaned row. The currency detected from the raw
+        balance (e.g. "$" -> "USD") is kept in a "currency" key, defaulting to the reporting currency.
     """
 
     # Step 1: Load the file
-    if file_path.endswith(".csv"):
-        df = pd.read_csv(file_path)
-    elif file_path.endswith((".xlsx", ".xls")):
-        df = pd.read_excel(file_path)
-    else:
-        raise ValueError("Only CSV and Excel files are supported.")
+    df = _read_table(file_path, extracted_columns.get("header_row", 0))
 
     # Extract relevant columns
     account_col = extracted_columns.get("account_number_column")
@@ -167,13 +267,7 @@ Only output the JSON block, no additional explanation.
 """
 
     # Step 3: Call the LLM
-    model = "mistral-small-latest"
-    client = Mistral(api_key=api_key)
-
-    chat_response = client.chat.complete(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    chat_response = complete_chat(api_key, "clean", prompt)
 
     response_text = chat_response.choices[0].message.content.strip()
 
@@ -183,7 +277,7 @@ Only output the JSON block, no additional explanation.
         raise ValueError(f"No JSON list found in LLM response. Full response:\n{response_text}")
 
     try:
-        cleaned_list = json.loads(json_match.group())
+        cleaned_list = _attach_currency(json.loads(json_match.group()), df, account_col, balance_col)
         print("✅ 2. Successfully cleaned the fields")
         return cleaned_list
     except json.JSONDecodeError:
@@ -1,10 +1,15 @@
 from classify import classify_trial_balance, segregate_financial_statements
 import json
-from mistralai import Mistral
+from model_router import complete_chat
 import re
+from money import to_minor, format_minor
+from currency import reporting_currency, currency_symbol
 
 
-def generate_profit_and_loss_statement(api_key, pnl):
+NO_EXPLANATION_RULE = "- Output only the statement tables. Do not add an explanation, commentary, notes or summary."
+
+
+def generate_profit_and_loss_statement(api_key, pnl, include_explanation=False, currency=None):
     """
     Extracts expenses, revenue, and their totals from the classified trial balance data,
     and generates a formatted Profit and Loss statement using the Mistral LLM.
@@ -12,13 +17,13 @@ def generate_profit_and_loss_statement(api_key, pnl):
     Parameters:
     - api_key (str): Mistral API key.
     - classified_data_json (str): JSON string returned by the classify_trial_balance function.
+    - include_explanation (bool): Let the model append a narrative. Off by default; use
+      explain_profit_and_loss to generate it on demand.
+    - currency (str): ISO code of the amounts. Defaults to the reporting currency.
 
     Returns:
-    - str: The formatted Profit and Loss statement, Net Profit.
+    - tuple: The formatted Profit and Loss statement, Net Profit as int paise.
     """
-    # Initialize Mistral client
-    model = "mistral-small-latest"
-    client = Mistral(api_key=api_key)
     
 
     # Parse the JSON data
@@ -31,21 +36,26 @@ def generate_profit_and_loss_statement(api_key, pnl):
     expenses = classified_data.get('expenses', [])
     revenue = classified_data.get('revenue', [])
 
-    # Extract totals
+    # Extract totals as exact paise (older inputs only carry rupee totals)
     totals = classified_data.get('totals', {})
-    total_expenses = totals.get('expenses', 0)
-    total_revenue = totals.get('revenue', 0)
-    # Calculate net profit
+    totals_minor = classified_data.get('totals_minor') or {name: to_minor(value) for name, value in totals.items()}
+    total_expenses = int(totals_minor.get('expenses', 0))
+    total_revenue = int(totals_minor.get('revenue', 0))
+    # Calculate net profit in exact paise, not float rupees
     net_profit = total_revenue - total_expenses
     # print(type(net_profit))
 
-    # Organize the extracted data
+    currency = currency or reporting_currency()
+    symbol = currency_symbol(currency)
+    label = symbol.strip()
+
+    # Organize the extracted data; amounts are only rendered to text here
     financial_data = {
         'expenses': expenses,
         'revenue': revenue,
-        'total_expenses': total_expenses,
-        'total_revenue': total_revenue,
-        'net_profit': net_profit
+        'total_expenses': format_minor(total_expenses, symbol),
+        'total_revenue': format_minor(total_revenue, symbol),
+        'net_profit': format_minor(net_profit, symbol)
     }
     print("✅ 7. Financial data extracted successfully for profit and loss statement.")
     # Define the prompt for the LLM
@@ -55,7 +65,7 @@ def generate_profit_and_loss_statement(api_key, pnl):
     Your task is to create a formal Profit and Loss statement using the JSON data provided. The JSON contains categorized financial data including revenue, expenses, and their respective totals.
 
     **Input Data:**
-    {json.dumps(financial_data, indent=2)}
+    {json.dumps(financial_data, indent=2, ensure_ascii=False)}
 
     **Output Requirements:**
     Generate a clear, properly formatted Profit and Loss statement with the following specifications:
@@ -63,28 +73,28 @@ def generate_profit_and_loss_statement(api_key, pnl):
     - Use the exact table structure provided below
     - Present revenue on the top side and expenses below
     - Include subtotals for each group and a grand total for net profit
-    - Format all currency values in Indian Rupees (₹)
-    - Use the following computed net profit: ₹{net_profit:,.2f}
+    - Format all currency values in {currency} ({label})
+    - Use the following computed net profit: {format_minor(net_profit, symbol)}
 
 
     **Profit and Loss Statement Format:**
-    | **Revenue**               | **Amount (₹)**     |
+    | **Revenue**               | **Amount ({label})**     |
     |---------------------------|--------------------|
     | Revenue Account 1         | [value]            |
     | Revenue Account 2         | [value]            |
     | ...                       | ...                |
-    | **Total Revenue**         | **₹{total_revenue:,.2f}**        |
+    | **Total Revenue**         | **{format_minor(total_revenue, symbol)}**        |
 
-    | **Expenses**              | **Amount (₹)**     |
+    | **Expenses**              | **Amount ({label})**     |
     |---------------------------|--------------------|
     | Expense Account 1         | [value]            |
     | Expense Account 2         | [value]            |
     | ...                       | ...                |
-    | **Total Expenses**        | **₹{total_expenses:,.2f}**        |
+    | **Total Expenses**        | **{format_minor(total_expenses, symbol)}**        |
 
-    | **Net Profit**             | **Amount (₹)**     |
+    | **Net Profit**             | **Amount ({label})**     |
     |---------------------------|--------------------|
-    |                           | **₹{net_profit:,.2f}**  |
+    |                           | **{format_minor(net_profit, symbol)}**  |
 
     **Important Notes:**
 
@@ -92,13 +102,11 @@ def generate_profit_and_loss_statement(api_key, pnl):
     - Include all revenue and expense accounts within their respective categories.
     - Align numeric values properly for readability.
     - Format currency values consistently (e.g., with commas as thousand separators).
+    {"" if include_explanation else NO_EXPLANATION_RULE}
     """
 
     # Send the prompt to the Mistral model
-    response = client.chat.complete(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    response = complete_chat(api_key, "profit_and_loss", prompt)
     
     # Extract and return the generated P&L statement
     pnl_statement = response.choices[0].message.content
@@ -110,6 +118,31 @@ def generate_profit_and_loss_statement(api_key, pnl):
     return pnl_statement, net_profit
 
 
+def explain_profit_and_loss(api_key, pnl_statement):
+    """
+    Generates the narrative explanation for an already generated Profit and Loss statement.
+
+    Parameters:
+    - api_key (str): Mistral API key.
+    - pnl_statement (str): Statement returned by generate_profit_and_loss_statement.
+
+    Returns:
+    - str: The explanation in markdown.
+    """
+    prompt = f"""
+    Explain the following Profit and Loss statement to a finance reviewer.
+
+    {pnl_statement}
+
+    - Describe the main revenue and expense drivers and how they lead to the net profit.
+    - Point out anything unusual, such as negative balances or a single account dominating a category.
+    - Use short markdown paragraphs or bullet points, at most 200 words. Do not repeat the table.
+    """
+    response = complete_chat(api_key, "explain", prompt)
+    print("✅ Generated Profit and Loss explanation.")
+    return response.choices[0].message.content
+
+
 # Example usage
 # Set Mistral API key
 # api_key = "YrEG1WcKWgMEPnQIDA9bxVV5dhjjlkBO"
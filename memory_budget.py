@@ -0,0 +1,272 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_SPILL_THRESHOLD = 0.8
+
+
+class SpilledLedger:
+    """
+    A list of ledger records written to a memory-mapped structured array on disk.
+
+    Iterating yields plain dicts again, so downstream stages (e.g. process_accounts_from_excel)
+    can consume it exactly like the in-memory list it replaces, one row at a time.
+    """
+
+    def __init__(self, path, dtype, length, numeric_fields):
+        self.path = path
+        self.dtype = dtype
+        self.length = length
+        self.numeric_fields = numeric_fields
+
+    def array(self):
+        return np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.length,))
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        arr = self.array()
+        names = arr.dtype.names
+        for row in arr:
+            yield {
+                name: (row[name].item() if name in self.numeric_fields else str(row[name]))
+                for name in names
+            }
+
+
+def ledger_to_frame(records):
+    """Builds a DataFrame from an in-memory list of ledger dicts or a SpilledLedger."""
+    if isinstance(records, SpilledLedger):
+        return pd.DataFrame(np.asarray(records.array()))
+    return pd.DataFrame(list(records or []))
+
+
+def spill_records(records, path):
+    """
+    Writes a list of flat dicts to a memory-mapped structured array at path.
+
+    Integer fields (e.g. paise amounts) are stored as int64, other numeric fields as float64 and
+    everything else as fixed-width unicode sized to the longest value, so the on-disk ledger
+    is dense and can be paged in lazily.
+
+    Parameters:
+    - records (list): List of dicts with identical keys (e.g. the output of clean_with_llm)
+    - path (str): File the array is written to
+
+    Returns:
+    - SpilledLedger
+    """
+    if not records:
+        raise ValueError("Cannot spill an empty ledger.")
+
+    fields = list(records[0].keys())
+    numeric_fields = set()
+    integer_fields = set()
+    widths = {}
+    for name in fields:
+        values = [r.get(name) for r in records]
+        present = [v for v in values if v is not None]
+        if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present):
+            numeric_fields.add(name)
+            integer_fields.add(name)
+        elif all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in present):
+            numeric_fields.add(name)
+        else:
+            widths[name] = max((len(str(v)) for v in values if v is not None), default=0) or 1
+
+    dtype = np.dtype([
+        (name, "i8") if name in integer_fields else
+        (name, "f8") if name in numeric_fields else (name, f"U{widths[name]}")
+        for name in fields
+    ])
+
+    arr = np.memmap(path, dtype=dtype, mode="w+", shape=(len(records),))
+    for i, record in enumerate(records):
+        arr[i] = tuple(
+            (record.get(name) or 0) if name in numeric_fields else str(record.get(name) or "")
+            for name in fields
+        )
+    arr.flush()
+    del arr
+
+    return SpilledLedger(path, dtype, len(records), numeric_fields)
+
+
+class _Tracer:
+    """
+    Shares the process-global tracemalloc between concurrent budgets (e.g. service workers).
+
+    Tracing starts with the first budget that needs it and stops when the last one is done.
+    The peak is only reset while a single budget is tracing; every acquire bumps a generation
+    counter so a stage can tell whether another run overlapped it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = 0
+        self._started = False
+        self.generation = 0
+
+    def acquire(self):
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._users += 1
+            self.generation += 1
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._started:
+                tracemalloc.stop()
+                self._started = False
+
+    def begin_stage(self):
+        """Resets the peak if this is the only traced run; returns a token for end_stage."""
+        with self._lock:
+            exclusive = self._users == 1
+            if exclusive:
+                tracemalloc.reset_peak()
+            return exclusive, self.generation
+
+    def end_stage(self, token):
+        """Returns (current, peak, exclusive) for a stage started with begin_stage."""
+        with self._lock:
+            exclusive, generation = token
+            current, peak = tracemalloc.get_traced_memory()
+            return current, peak, exclusive and self._users == 1 and generation == self.generation
+
+
+_tracer = _Tracer()
+
+
+class MemoryBudget:
+    """
+    Records per-stage wall time and, when tracing, peak memory with tracemalloc; spills
+    intermediate ledgers to disk when usage approaches the configured budget.
+
+    tracemalloc slows allocation-heavy stages several times over, so it only runs when a
+    limit is set or tracing is asked for. It is process-global: when several runs trace at
+    once, per-stage peaks cover all of them and are marked as shared in the report.
+
+    Parameters:
+    - limit_mb (float): Memory budget in MB. None (or 0) never spills.
+    - spill_threshold (float): Fraction of the budget at which ledgers are spilled.
+    - spill_dir (str): Directory for spilled arrays. A private temp dir is used if omitted.
+    - trace (bool): Record peak memory. Defaults to on only when limit_mb is set.
+    """
+
+    def __init__(self, limit_mb=None, spill_threshold=DEFAULT_SPILL_THRESHOLD, spill_dir=None, trace=None):
+        self.limit_bytes = int(limit_mb * 1024 * 1024) if limit_mb else None
+        self.spill_threshold = spill_threshold
+        self.trace = bool(self.limit_bytes) if trace is None else trace
+        self._spill_dir = spill_dir
+        self._owns_spill_dir = spill_dir is None
+        self._tracing = False
+        self.stages = []
+        self.spilled = []
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a budget from MEMORY_BUDGET_MB (unset = no limit) and MEMORY_TRACE ("1" records
+        peak memory without a limit).
+        """
+        limit = os.getenv("MEMORY_BUDGET_MB")
+        trace = os.getenv("MEMORY_TRACE", "").lower() in ("1", "true", "yes")
+        return cls(limit_mb=float(limit) if limit else None, trace=trace or None)
+
+    def start(self):
+        if self.trace and not self._tracing:
+            _tracer.acquire()
+            self._tracing = True
+        return self
+
+    def close(self):
+        if self._tracing:
+            _tracer.release()
+            self._tracing = False
+        if self._owns_spill_dir and self._spill_dir and os.path.isdir(self._spill_dir):
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @contextmanager
+    def stage(self, name):
+        """Records the wall time, and the peak traced memory when tracing, of the block."""
+        self.start()
+        token = _tracer.begin_stage() if self._tracing else None
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {"stage": name, "seconds": time.perf_counter() - started,
+                      "peak_bytes": None, "current_bytes": None, "shared": False}
+            if token is not None:
+                current, peak, exclusive = _tracer.end_stage(token)
+                record.update(peak_bytes=peak, current_bytes=current, shared=not exclusive)
+            self.stages.append(record)
+
+    def near_limit(self, extra_bytes=0):
+        if not self.limit_bytes or not self._tracing:
+            return False
+        current, _ = tracemalloc.get_traced_memory()
+        return current + extra_bytes >= self.limit_bytes * self.spill_threshold
+
+    def maybe_spill(self, name, records):
+        """
+        Returns records unchanged while there is headroom, otherwise writes them to a
+        memory-mapped array on disk and returns the SpilledLedger that replaces them.
+        """
+        if not records or isinstance(records, SpilledLedger) or not self.near_limit():
+            return records
+
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="ledger_spill_")
+        path = os.path.join(self._spill_dir, f"{name}.mmap")
+        spilled = spill_records(records, path)
+        self.spilled.append(name)
+        print(f"💾 Spilled '{name}' ({len(spilled)} rows) to disk to stay within the memory budget.")
+        return spilled
+
+    def peak_bytes(self):
+        return max((s["peak_bytes"] for s in self.stages if s["peak_bytes"] is not None), default=0)
+
+    def report(self):
+        """Returns the per-stage time and peak memory as a markdown table."""
+        def mb(value):
+            return f"{value / 1048576:,.2f}" if value is not None else "–"
+
+        lines = [
+            "| **Stage** | **Time (s)** | **Peak (MB)** | **Retained (MB)** |",
+            "|-----------|--------------|---------------|-------------------|",
+        ]
+        for s in self.stages:
+            shared = " (shared)" if s["shared"] else ""
+            lines.append(
+                f"| {s['stage']} | {s['seconds']:,.2f} | {mb(s['peak_bytes'])}{shared} | "
+                f"{mb(s['current_bytes'])} |"
+            )
+        if self.trace:
+            lines.append(f"| **Overall peak** | | **{mb(self.peak_bytes())}** | |")
+        if any(s["shared"] for s in self.stages):
+            lines.append("| Peaks marked shared include concurrent runs | | | |")
+        if self.limit_bytes:
+            lines.append(f"| Budget | | {mb(self.limit_bytes)} | |")
+        if self.spilled:
+            lines.append(f"| Spilled to disk | | {', '.join(self.spilled)} | |")
+        return "\n".join(lines)
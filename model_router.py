@@ -0,0 +1,249 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from mistralai import Mistral
+
+
+# Fastest first. Each entry: model, default seconds per 1k prompt chars, cost per 1M tokens (USD)
+MODEL_TIERS = [
+    {"model": "ministral-8b-latest", "seconds_per_kchar": 0.15, "cost_per_mtok": 0.1},
+    {"model": "mistral-small-latest", "seconds_per_kchar": 0.3, "cost_per_mtok": 0.2},
+    {"model": "mistral-large-latest", "seconds_per_kchar": 0.8, "cost_per_mtok": 2.0},
+]
+DEFAULT_MODEL = "mistral-small-latest"
+FASTEST_MODEL = MODEL_TIERS[0]["model"]
+BASE_LATENCY_SECONDS = 0.5
+CHARS_PER_TOKEN = 4
+EWMA_ALPHA = 0.3
+HISTORY_HALF_LIFE_SECONDS = 3600  # measured latencies fade back to the tier default at this rate
+PROBE_EVERY = 20  # a demoted stage still sends every Nth call to its preferred model
+
+# Per-stage preferred model, model for small prompts, latency budget (seconds) and cost budget (USD per call)
+DEFAULT_STAGE_BUDGETS = {
+    "detect_columns": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 5, "cost_usd": 0.01},
+    "clean": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 60, "cost_usd": 0.5},
+    "auditor": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 60, "cost_usd": 0.5},
+    "classify": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 90, "cost_usd": 0.5},
+    "repair": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 30, "cost_usd": 0.1},
+    "profit_and_loss": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 45, "cost_usd": 0.1},
+    "balance_sheet": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 45, "cost_usd": 0.1},
+    "explain": {"model": DEFAULT_MODEL, "small_input_model": FASTEST_MODEL, "latency_s": 30, "cost_usd": 0.05},
+}
+SMALL_INPUT_CHARS = 2000
+
+
+class ModelRouter:
+    """
+    Chooses a Mistral model per pipeline stage from the prompt size, the latency measured on
+    previous calls and the stage's latency/cost budget.
+
+    The stage's preferred model is used unless its predicted latency or cost exceeds the
+    budget, in which case the router steps down to faster tiers. Prompts shorter than
+    small_input_chars go to the stage's small_input_model (the fastest tier by default, or
+    the stage's model when only that is configured). Every decision is printed and kept,
+    with the measured latency, in the log returned by collect().
+
+    Measured latencies decay back to the tier defaults with a half-life, and a stage that
+    was demoted still sends every probe_every-th call to its preferred model, so one slow
+    call cannot demote a stage for good.
+
+    Parameters:
+    - budgets (dict): Stage → {"model", "small_input_model", "latency_s", "cost_usd"}; merged
+      over the defaults.
+    - history_path (str): Optional JSON file where measured latencies are persisted.
+    - small_input_chars (int): Prompt size below which small_input_model is used.
+    - half_life_s (float): Seconds after which a measurement counts half as much.
+    - probe_every (int): Re-probe interval for demoted stages, in calls. 0 disables probing.
+    """
+
+    def __init__(self, budgets=None, history_path=None, small_input_chars=SMALL_INPUT_CHARS,
+                 half_life_s=HISTORY_HALF_LIFE_SECONDS, probe_every=PROBE_EVERY):
+        self.budgets = {stage: dict(b) for stage, b in DEFAULT_STAGE_BUDGETS.items()}
+        for stage, budget in (budgets or {}).items():
+            merged = self.budgets.setdefault(stage, {"model": DEFAULT_MODEL})
+            if "model" in budget and "small_input_model" not in budget:
+                # A stage pinned to a model keeps it for small prompts too
+                merged.pop("small_input_model", None)
+            merged.update(budget)
+        self.history_path = history_path
+        self.small_input_chars = small_input_chars
+        self.half_life_s = half_life_s
+        self.probe_every = probe_every
+        self._calls = {}
+        self.tiers = {t["model"]: t for t in MODEL_TIERS}
+        self._order = [t["model"] for t in MODEL_TIERS]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.history = self._load_history()
+
+    @classmethod
+    def from_env(cls):
+        """Budgets from the MODEL_ROUTING JSON file and history from ROUTER_HISTORY, if set."""
+        budgets = None
+        path = os.getenv("MODEL_ROUTING")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                budgets = json.load(f)
+        return cls(budgets, history_path=os.getenv("ROUTER_HISTORY"))
+
+    def _load_history(self):
+        if self.history_path and os.path.exists(self.history_path):
+            try:
+                with open(self.history_path, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {}
+
+    def _save_history(self):
+        if not self.history_path:
+            return
+        tmp_path = f"{self.history_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.history, f, indent=2)
+        os.replace(tmp_path, self.history_path)
+
+    def _measured_rate(self, stage, model):
+        """Measured seconds per 1k chars, decayed toward the tier default by age; None if unmeasured."""
+        with self._lock:
+            entry = self.history.get(stage, {}).get(model)
+        if entry is None:
+            return None
+        if not isinstance(entry, dict):  # history files written before decay was added
+            entry = {"rate": entry, "at": 0}
+        default = self.tiers.get(model, {}).get("seconds_per_kchar", 0.3)
+        age = max(time.time() - entry.get("at", 0), 0)
+        weight = 0.5 ** (age / self.half_life_s) if self.half_life_s else 1.0
+        return default + (entry["rate"] - default) * weight
+
+    def predict_latency(self, stage, model, input_chars):
+        """Predicted seconds for a call, from the decayed EWMA of measured seconds per 1k chars."""
+        measured = self._measured_rate(stage, model)
+        rate = measured if measured is not None else self.tiers.get(model, {}).get("seconds_per_kchar", 0.3)
+        return BASE_LATENCY_SECONDS + rate * input_chars / 1000
+
+    def predict_cost(self, model, input_chars):
+        tokens = input_chars / CHARS_PER_TOKEN
+        return tokens / 1_000_000 * self.tiers.get(model, {}).get("cost_per_mtok", 0.0)
+
+    def route(self, stage, input_chars):
+        """
+        Picks the model for one call.
+
+        Returns:
+        - dict: stage, model, input_chars, predicted_s, budget_s, reason
+        """
+        budget = self.budgets.get(stage, {"model": DEFAULT_MODEL})
+        preferred = budget.get("model", DEFAULT_MODEL)
+        latency_budget = budget.get("latency_s")
+        cost_budget = budget.get("cost_usd")
+
+        if input_chars < self.small_input_chars:
+            model, reason = budget.get("small_input_model", preferred), "small input"
+        else:
+            model, reason = preferred, "preferred"
+            candidates = self._order[:self._order.index(preferred) + 1] if preferred in self._order else [preferred]
+            for candidate in reversed(candidates):
+                over_latency = latency_budget is not None and \
+                    self.predict_latency(stage, candidate, input_chars) > latency_budget
+                over_cost = cost_budget is not None and self.predict_cost(candidate, input_chars) > cost_budget
+                model = candidate
+                if not (over_latency or over_cost):
+                    break
+                reason = "fallback: latency budget" if over_latency else "fallback: cost budget"
+
+            # Only a latency fallback can be a stale measurement; re-probe the preferred model
+            if reason == "fallback: latency budget" and self.probe_every:
+                with self._lock:
+                    self._calls[stage] = self._calls.get(stage, 0) + 1
+                    probe = self._calls[stage] % self.probe_every == 0
+                if probe and not (cost_budget is not None and self.predict_cost(preferred, input_chars) > cost_budget):
+                    model, reason = preferred, "probe: preferred model"
+
+        return {
+            "stage": stage,
+            "model": model,
+            "input_chars": input_chars,
+            "predicted_s": round(self.predict_latency(stage, model, input_chars), 2),
+            "budget_s": latency_budget,
+            "reason": reason,
+        }
+
+    def record(self, stage, model, input_chars, seconds):
+        """Folds a measured call latency into the per-stage, per-model history."""
+        rate = max(seconds - BASE_LATENCY_SECONDS, 0.0) / max(input_chars / 1000, 0.001)
+        previous = self._measured_rate(stage, model)
+        rate = rate if previous is None else EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * previous
+        with self._lock:
+            self.history.setdefault(stage, {})[model] = {"rate": rate, "at": time.time()}
+            self._save_history()
+
+    @contextmanager
+    def collect(self):
+        """Collects the routing decisions made by this thread inside the block into a list."""
+        log = []
+        previous = getattr(self._local, "log", None)
+        self._local.log = log
+        try:
+            yield log
+        finally:
+            self._local.log = previous
+
+    def complete(self, api_key, stage, prompt):
+        """
+        Routes, sends and times one chat completion for a stage.
+
+        Returns:
+        - The Mistral chat response.
+        """
+        decision = self.route(stage, len(prompt))
+        print(f"🧭 {stage}: {decision['model']} ({decision['reason']}, "
+              f"~{decision['predicted_s']}s of {decision['budget_s']}s budget)")
+
+        client = Mistral(api_key=api_key)
+        start = time.perf_counter()
+        response = client.chat.complete(
+            model=decision["model"],
+            messages=[{"role": "user", "content": prompt}],
+        )
+        decision["actual_s"] = round(time.perf_counter() - start, 2)
+        self.record(stage, decision["model"], len(prompt), decision["actual_s"])
+
+        log = getattr(self._local, "log", None)
+        if log is not None:
+            log.append(decision)
+        return response
+
+
+def routing_report(decisions):
+    """Returns routing decisions as a markdown table."""
+    lines = [
+        "| **Stage** | **Model** | **Reason** | **Prompt chars** | **Predicted (s)** | **Actual (s)** | **Budget (s)** |",
+        "|-----------|-----------|------------|------------------|-------------------|----------------|----------------|",
+    ]
+    for d in decisions:
+        lines.append(
+            f"| {d['stage']} | {d['model']} | {d['reason']} | {d['input_chars']:,} | "
+            f"{d['predicted_s']} | {d.get('actual_s', '')} | {d['budget_s']} |"
+        )
+    return "\n".join(lines)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide router, built from the environment on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter.from_env()
+        return _router
+
+
+def complete_chat(api_key, stage, prompt):
+    """Sends prompt for the given pipeline stage through the shared router."""
+    return get_router().complete(api_key, stage, prompt)
@@ -0,0 +1,64 @@
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+import pandas as pd
+
+
+MINOR_UNITS = 100  # paise per rupee
+_SEPARATORS = r"[,_'\s]"
+
+
+def parse_major(values, errors="raise"):
+    """
+    Major-unit floats from numbers or numeric strings; thousands separators are ignored.
+    Missing values are NaN. Other non-numeric strings raise ValueError, or become NaN with
+    errors="coerce".
+    """
+    series = pd.Series(values)
+    if not pd.api.types.is_numeric_dtype(series):
+        text = series.astype("string").str.replace(_SEPARATORS, "", regex=True).str.strip()
+        numbers = pd.to_numeric(text, errors="coerce")
+        bad = numbers.isna() & text.fillna("").ne("") & ~text.str.lower().isin(["nan", "none"]).fillna(False)
+        if bad.any() and errors == "raise":
+            raise ValueError(f"Not a numeric amount: {', '.join(map(repr, text[bad].head(5)))}")
+        series = numbers
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def to_minor(values):
+    """
+    Converts amounts in major units (rupees, as floats, numeric strings such as "1,000.50" or a
+    Series) to int64 minor units (paise), rounding the decimal value half away from zero
+    (0.285 -> 29). Missing values become 0; other non-numeric strings raise ValueError.
+
+    Returns:
+    - ndarray | int: int64 array for array-like input, int for a scalar.
+    """
+    scalar = np.isscalar(values) or values is None
+    major = np.nan_to_num(parse_major([values] if scalar else values), nan=0.0)
+    scaled = major * MINOR_UNITS
+    minor = np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)
+
+    # Scaling can land a hair off an exact half (0.285 * 100 = 28.4999...); redo those few
+    # from the shortest decimal repr of the input so rounding follows the written amount
+    tolerance = np.maximum(np.abs(scaled) * 8 * np.finfo(np.float64).eps, 1e-9)
+    near_half = np.abs(np.abs(scaled) % 1 - 0.5) < tolerance
+    for i in np.flatnonzero(near_half):
+        minor[i] = float((Decimal(repr(float(major[i]))) * MINOR_UNITS).to_integral_value(ROUND_HALF_UP))
+
+    minor = minor.astype(np.int64)
+    return int(minor[0]) if scalar else minor
+
+
+def from_minor(minor):
+    """Converts int64 minor units back to major-unit floats, for JSON payloads and prompts."""
+    if np.isscalar(minor):
+        return int(minor) / MINOR_UNITS
+    return np.asarray(minor, dtype=np.int64) / MINOR_UNITS
+
+
+def format_minor(minor, symbol="₹"):
+    """Renders minor units as a currency string (e.g. 123456 -> '₹1,234.56') without floats."""
+    minor = int(minor)
+    sign = "-" if minor < 0 else ""
+    major, cents = divmod(abs(minor), MINOR_UNITS)
+    return f"{sign}{symbol}{major:,}.{cents:02d}"
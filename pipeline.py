@@ -0,0 +1,246 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from extract import extract_account_fields_from_file, clean_with_llm
+from classify import classify_trial_balance, segregate_financial_statements
+from income import generate_profit_and_loss_statement, explain_profit_and_loss
+from balance_sheet import generate_balance_sheet, explain_balance_sheet
+from memory_budget import MemoryBudget, ledger_to_frame
+from currency import convert_to_reporting, reporting_currency
+from money import from_minor
+from artifact_store import content_hash, artifact_key, RunCancelled
+from reconcile import reconcile_and_repair
+from model_router import get_router, routing_report
+from analysis import variance_scan, summarize_anomalies
+
+
+# Bump when stage outputs change shape so stored artifacts from older code are not reused
+ARTIFACT_VERSION = 3
+
+EXPLAINERS = {
+    "profit_and_loss": ("pnl_statement", explain_profit_and_loss),
+    "balance_sheet": ("bs_statement", explain_balance_sheet),
+}
+
+
+def _detect_columns(file_path, api_key):
+    columns = extract_account_fields_from_file(file_path, api_key)
+    if columns.get("error"):
+        raise ValueError(f"Column detection failed: {columns['error']}")
+    return columns
+
+
+def _file_fingerprint(path):
+    return content_hash(path) if path and os.path.exists(path) else path
+
+
+def pipeline_config(fx_as_of=None):
+    """
+    Settings the stored artifacts depend on besides the file contents: the reporting currency,
+    the FX rate table and date, and the chart of accounts (by content, so editing the files
+    counts as a change).
+    """
+    return {
+        "version": ARTIFACT_VERSION,
+        "reporting_currency": reporting_currency(),
+        "fx_rates": _file_fingerprint(os.getenv("FX_RATES")),
+        "fx_as_of": str(fx_as_of) if fx_as_of is not None else None,
+        "chart_of_accounts": _file_fingerprint(os.getenv("CHART_OF_ACCOUNTS")),
+    }
+
+
+def pipeline_key(file_path, fx_as_of=None):
+    """Artifact key for a trial balance file under the current settings."""
+    return artifact_key(content_hash(file_path), pipeline_config(fx_as_of))
+
+
+@contextmanager
+def _scratch_dir(store, key):
+    if store is not None:
+        with store.scratch_dir(key) as path:
+            yield path
+    else:
+        with tempfile.TemporaryDirectory(prefix="tb_run_") as path:
+            yield path
+
+
+def _variance_stage(classified, prior_periods):
+    rows = variance_scan(classified, prior_periods)
+    return {"variance": summarize_anomalies(rows), "variance_table": rows}
+
+
+def run_pipeline(api_key, file_path, memory_budget=None, progress=print, store=None, key=None,
+                 fx_as_of=None, prior_periods=None):
+    """
+    Runs the full extract → clean → classify → segregate → P&L → balance sheet chain on a
+    trial balance file.
+
+    When the memory budget is nearly used after cleaning, the cleaned ledger is spilled to a
+    memory-mapped file and the pipeline keeps only a handle to it between stages; classify
+    and reconcile each page it back in as a DataFrame while they run. The JSON strings passed
+    between the later stages are held in memory as usual.
+
+    With an ArtifactStore, stage outputs are stored under the file's content hash and the
+    pipeline settings (see pipeline_key) and reused on the next run of the same file. A
+    classification that fails reconciliation, and the statements built from it, are not
+    stored, so the next run tries again.
+
+    Parameters:
+    - api_key (str): Mistral API key.
+    - file_path (str): Path to the trial balance CSV/Excel file.
+    - memory_budget (MemoryBudget): Budget to track/enforce. Defaults to MemoryBudget.from_env().
+    - progress (callable): Called with a status message before each stage.
+    - store (ArtifactStore): Optional artifact store for stage outputs.
+    - key (str): Artifact key of file_path (pipeline_key), computed if omitted.
+    - fx_as_of (str | date): Date used to pick FX rates from the FX_RATES table (latest if omitted).
+    - prior_periods (list): Prior classified ledgers, oldest first, for the variance scan.
+
+    Returns:
+    - dict: classified, reconciliation, balance_sheet, pnl, pnl_statement, net_profit (rupees),
+      net_profit_minor (int paise), bs_statement, memory_report, routing (model decisions of
+      this run) and routing_report; with prior_periods also variance (anomaly summary) and
+      variance_table (all accounts)
+    """
+    budget = memory_budget or MemoryBudget.from_env()
+    if store is not None:
+        key = key or pipeline_key(file_path, fx_as_of)
+    # Stored results only; a reconciliation that failed is recomputed on the next run
+    reconciled = store.get(key, "reconciled") if store is not None else None
+
+    def cached(name, compute, keep=None):
+        if store is None:
+            return compute()
+        return store.get_or_compute(key, name, compute, keep)
+
+    with budget, get_router().collect() as routing:
+        with budget.stage("extract"):
+            cleaned = None
+            if reconciled is None:
+                progress("🔍 Step 1: Detecting account columns...")
+                columns = cached("columns", lambda: _detect_columns(file_path, api_key))
+                cleaned = cached("cleaned", lambda: clean_with_llm(file_path, columns, api_key), keep=bool)
+                if cleaned:
+                    cleaned = convert_to_reporting(ledger_to_frame(cleaned), as_of=fx_as_of).to_dict(orient="records")
+                cleaned = budget.maybe_spill("cleaned_ledger", cleaned)
+            else:
+                columns = store.get(key, "columns")
+
+        with budget.stage("classify"):
+            progress("🚀 Step 2: Classifying Trial Balance using LLM...")
+            if reconciled is None:
+                # Scratch space only when the LLM actually runs; removed once classification is done
+                with _scratch_dir(store, key) as run_dir:
+                    raw_classified = classify_trial_balance(
+                        api_key, cleaned, os.path.join(run_dir, "trial_balance.json"))
+
+        with budget.stage("reconcile"):
+            progress("🧮 Step 2b: Reconciling classification against the input ledger...")
+            if reconciled is None:
+                reconciled = list(reconcile_and_repair(api_key, raw_classified, cleaned))
+                if store is not None and reconciled[1]["ok"]:
+                    store.put(key, "reconciled", reconciled)
+                del cleaned, raw_classified
+            classified, reconciliation = reconciled
+
+        # Statements built from an unreconciled classification are not worth keeping either
+        statements_ok = bool(reconciliation["ok"])
+
+        with budget.stage("segregate"):
+            progress("🧩 Step 3: Segregating data into Balance Sheet and P&L sections...")
+            balance_sheet, pnl = segregate_financial_statements(classified)
+
+        variance = {}
+        if prior_periods:
+            with budget.stage("variance"):
+                progress("🔎 Step 3b: Scanning period-over-period variances...")
+                variance = _variance_stage(classified, prior_periods)
+
+        with budget.stage("profit_and_loss"):
+            progress("📈 Step 4: Generating Profit & Loss Statement...")
+            pnl_statement, net_profit_minor = cached(
+                "profit_and_loss", lambda: list(generate_profit_and_loss_statement(api_key, pnl)),
+                keep=lambda _: statements_ok)
+
+        with budget.stage("balance_sheet"):
+            progress("📊 Step 5: Generating Balance Sheet...")
+            bs_statement = cached(
+                "balance_sheet", lambda: generate_balance_sheet(api_key, balance_sheet, net_profit_minor),
+                keep=lambda _: statements_ok)
+
+        memory_report = budget.report()
+        print("✅ Time and peak memory per stage:\n" + memory_report)
+        if routing:
+            print("🧭 Model routing:\n" + routing_report(routing))
+
+    return {
+        **variance,
+        "key": key,
+        "columns": columns,
+        "classified": classified,
+        "reconciliation": reconciliation,
+        "balance_sheet": balance_sheet,
+        "pnl": pnl,
+        "pnl_statement": pnl_statement,
+        "net_profit": from_minor(net_profit_minor),
+        "net_profit_minor": net_profit_minor,
+        "bs_statement": bs_statement,
+        "memory_report": memory_report,
+        "routing": routing,
+        "routing_report": routing_report(routing),
+    }
+
+
+def run_pipeline_cached(api_key, file_path, store, prior_periods=None, cancelled=None, progress=print, **kwargs):
+    """
+    Runs the pipeline through an ArtifactStore with single-flight coalescing: concurrent
+    calls for identical file contents share one computation, and later calls reuse the
+    stored artifacts. The variance scan depends on each caller's prior periods, so it runs
+    per caller after the shared computation.
+
+    cancelled is polled by this caller. Once it returns true the caller gets RunCancelled;
+    the shared computation only stops at the next stage boundary if no other caller is
+    waiting for it.
+    """
+    key = pipeline_key(file_path, kwargs.get("fx_as_of"))
+
+    def shared_progress(message):
+        if cancelled is not None and cancelled() and not store.waiting(key):
+            raise RunCancelled()
+        progress(message)
+
+    result = store.single_flight(
+        key, lambda: run_pipeline(api_key, file_path, store=store, key=key, progress=shared_progress, **kwargs),
+        cancelled)
+    if cancelled is not None and cancelled():
+        raise RunCancelled()
+    if prior_periods:
+        result = {**result, **_variance_stage(result["classified"], prior_periods)}
+    return result
+
+
+def explain_statement(api_key, result, kind, store=None):
+    """
+    Generates the narrative explanation of a statement on demand. Statements are produced
+    without one, so the tokens are only spent when a user asks. With a store, the explanation
+    is cached next to the run's other artifacts and concurrent requests share one call.
+
+    Parameters:
+    - api_key (str): Mistral API key.
+    - result (dict): Output of run_pipeline / run_pipeline_cached.
+    - kind (str): "profit_and_loss" or "balance_sheet".
+    - store (ArtifactStore): Optional artifact store.
+
+    Returns:
+    - str: The explanation in markdown.
+    """
+    field, explain = EXPLAINERS[kind]
+    statement = result[field]
+    if store is None or not result.get("key"):
+        return explain(api_key, statement)
+
+    name = f"explanation_{kind}"
+    # Statements of an unreconciled run are regenerated next time, so their explanation is not kept
+    keep = lambda _: bool(result.get("reconciliation", {}).get("ok"))
+    return store.single_flight(
+        f"{result['key']}:{name}",
+        lambda: store.get_or_compute(result["key"], name, lambda: explain(api_key, statement), keep))
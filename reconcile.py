@@ -0,0 +1,291 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from model_router import complete_chat
+from memory_budget import ledger_to_frame
+from collections import Counter
+from money import to_minor, from_minor, parse_major
+
+
+CATEGORIES = ["assets", "liabilities", "equity", "expenses", "revenue"]
+DEBIT_NORMAL = {"assets", "expenses"}
+
+
+def _normalize_account(series):
+    return series.fillna("").astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+def _account_key(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return re.sub(r"\.0$", "", str(value).strip())
+
+
+def _ledger_frame(cleaned):
+    """
+    Input ledger (output of clean_with_llm, possibly spilled) with debit-positive int64 paise.
+    Rows without an account number (e.g. "Total" / "Grand Total" lines) are not accounts and
+    are dropped, so they are neither reported missing nor counted twice.
+    """
+    df = ledger_to_frame(cleaned).rename(columns={"account_number": "accountNumber", "account_name": "accountName"})
+    df["accountNumber"] = _normalize_account(df["accountNumber"])
+    df = df[~df["accountNumber"].isin(["", "nan", "None"])]
+    if "closing_balance_minor" in df.columns:
+        df["balance_minor"] = df["closing_balance_minor"].to_numpy(dtype=np.int64)
+    else:
+        df["balance_minor"] = to_minor(df["closing_balance"])
+    return df[["accountNumber", "accountName", "balance_minor"]]
+
+
+def classified_frame(classified_data):
+    """
+    Classified accounts as one DataFrame with a debit-positive int64 'balance_minor' column.
+    Amounts the LLM returned as non-numbers (e.g. "N/A") count as 0 and are marked with
+    amount_valid=False, so reconcile can send those accounts back for repair.
+    """
+    frames = [
+        pd.DataFrame(classified_data.get(category) or [], columns=[
+            "accountNumber", "accountName", "amount", "balanceType"]).assign(category=category)
+        for category in CATEGORIES
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    df["accountNumber"] = _normalize_account(df["accountNumber"])
+    major = parse_major(df["amount"], errors="coerce")
+    df["amount_valid"] = ~np.isnan(major)
+    amount_minor = np.abs(to_minor(np.nan_to_num(major, nan=0.0)))
+    is_credit = df["balanceType"].astype(str).str.lower().str.startswith("cr").to_numpy()
+    df["balance_minor"] = np.where(is_credit, -amount_minor, amount_minor)
+    return df
+
+
+def compute_totals_minor(classified_df):
+    """
+    Recomputes category totals from the classified accounts instead of trusting the LLM, as
+    exact int64 paise. Each category is reported in its normal-balance direction
+    (assets/expenses debit-positive, liabilities/equity/revenue credit-positive).
+    """
+    by_category = classified_df.groupby("category")["balance_minor"].sum()
+    totals = {
+        category: int(by_category.get(category, 0)) * (1 if category in DEBIT_NORMAL else -1)
+        for category in CATEGORIES
+    }
+    balances = classified_df["balance_minor"].to_numpy(dtype=np.int64)
+    totals["debits"] = int(balances[balances > 0].sum())
+    totals["credits"] = int(-balances[balances < 0].sum())
+    return totals
+
+
+def classified_totals(classified_data):
+    """
+    Totals for a classified dict.
+
+    Returns:
+    - tuple: (totals in rupees, totals_minor in int paise)
+    """
+    totals_minor = compute_totals_minor(classified_frame(classified_data))
+    return {name: from_minor(value) for name, value in totals_minor.items()}, totals_minor
+
+
+def reconcile(classified, cleaned):
+    """
+    Checks the LLM classification against the input ledger with vectorized pandas operations.
+
+    Checks performed:
+    - Total debits equal total credits in the classified accounts
+    - Assets = Liabilities + Equity + (Revenue - Expenses)
+    - Every input account is classified, with as many rows as the input has for it
+      (missing / duplicated accounts)
+    - No classified account is absent from the input (phantom accounts)
+    - Per account, the classified amounts are numbers and sum to the input closing balances
+
+    Parameters:
+    - classified (str): JSON string returned from classify_trial_balance
+    - cleaned (list | SpilledLedger): Ledger returned by clean_with_llm
+
+    Returns:
+    - dict: ok, checks, totals, totals_minor, missing, phantom, duplicated, mismatched
+    """
+    classified_data = json.loads(classified) if isinstance(classified, str) else classified
+    ledger = _ledger_frame(cleaned)
+    classified_df = classified_frame(classified_data)
+    totals_minor = compute_totals_minor(classified_df)
+    category_minor = classified_df.groupby("category")["balance_minor"].sum()
+
+    # Compare per account against the input, so an account number that legitimately appears on
+    # several input rows (e.g. one per company code) is fine as long as rows and amounts agree
+    input_accounts = ledger.groupby("accountNumber").agg(
+        rows=("balance_minor", "size"), balance_minor=("balance_minor", "sum"))
+    classified_accounts = classified_df.groupby("accountNumber").agg(
+        rows=("balance_minor", "size"), balance_minor=("balance_minor", "sum"),
+        amounts_valid=("amount_valid", "all"))
+    merged = input_accounts.merge(
+        classified_accounts, left_index=True, right_index=True, how="outer",
+        suffixes=("_input", "_classified"), indicator=True,
+    )
+    missing = merged.index[merged["_merge"] == "left_only"].tolist()
+    phantom = merged.index[merged["_merge"] == "right_only"].tolist()
+    both = merged[merged["_merge"] == "both"]
+    duplicated = both.index[both["rows_classified"] > both["rows_input"]].tolist()
+    mismatched = both.index[
+        (both["rows_classified"] <= both["rows_input"]) & (
+            (both["balance_minor_input"] != both["balance_minor_classified"])
+            | (both["rows_classified"] < both["rows_input"])
+            | ~both["amounts_valid"].astype(bool))
+    ].tolist()
+
+    natural = {c: int(category_minor.get(c, 0)) * (1 if c in DEBIT_NORMAL else -1) for c in CATEGORIES}
+    equation_gap_minor = natural["assets"] - (
+        natural["liabilities"] + natural["equity"] + natural["revenue"] - natural["expenses"])
+    debit_credit_gap_minor = int(classified_df["balance_minor"].sum())
+    checks = {
+        "debits_equal_credits": debit_credit_gap_minor == 0,
+        "accounting_equation": equation_gap_minor == 0,
+        "input_balanced": int(ledger["balance_minor"].sum()) == 0,
+        "no_missing_accounts": not missing,
+        "no_phantom_accounts": not phantom,
+        "no_duplicate_accounts": not duplicated,
+        "amounts_match": not mismatched,
+    }
+    # An unbalanced input cannot be fixed by reclassifying, so it does not fail reconciliation
+    ok = all(v for k, v in checks.items() if k != "input_balanced")
+
+    report = {
+        "ok": ok,
+        "checks": checks,
+        "totals": {name: from_minor(value) for name, value in totals_minor.items()},
+        "totals_minor": totals_minor,
+        "equation_gap": from_minor(equation_gap_minor),
+        "missing": missing,
+        "phantom": phantom,
+        "duplicated": duplicated,
+        "mismatched": mismatched,
+    }
+    print(f"{'✅' if ok else '⚠️'} Reconciliation: " + ", ".join(
+        f"{k}={'ok' if v else 'FAIL'}" for k, v in checks.items()))
+    return report
+
+
+def repair_classification(api_key, classified, cleaned, report):
+    """
+    Re-prompts the LLM for only the accounts that failed reconciliation and merges the answer
+    back into the classification. Phantom accounts are dropped, and totals are recomputed
+    from the accounts. An offending account keeps its original rows unless the LLM returns
+    one entry for every input row of it.
+
+    Parameters:
+    - api_key (str): Mistral API key.
+    - classified (str): JSON string returned from classify_trial_balance
+    - cleaned (list | SpilledLedger): Ledger returned by clean_with_llm
+    - report (dict): Output of reconcile
+
+    Returns:
+    - str: Repaired classified JSON string, same structure as classify_trial_balance
+    """
+    classified_data = json.loads(classified) if isinstance(classified, str) else classified
+    offending = set(report["missing"]) | set(report["duplicated"]) | set(report["mismatched"])
+    drop = offending | set(report["phantom"])
+
+    ledger = _ledger_frame(cleaned)
+    targets = ledger[ledger["accountNumber"].isin(offending)]
+
+    repaired = {
+        category: [
+            entry for entry in (classified_data.get(category) or [])
+            if _account_key(entry.get("accountNumber")) not in drop
+        ]
+        for category in CATEGORIES
+    }
+
+    if not targets.empty:
+        accounts = [
+            {
+                "accountNumber": row.accountNumber,
+                "accountName": str(row.accountName),
+                "debit": from_minor(row.balance_minor) if row.balance_minor > 0 else 0,
+                "credit": from_minor(-row.balance_minor) if row.balance_minor < 0 else 0,
+            }
+            for row in targets.itertuples(index=False)
+        ]
+
+        prompt = f"""
+    You are a financial accounting expert. The following trial balance accounts need to be categorized
+    into exactly one of: assets, liabilities, equity, expenses, revenue.
+
+    INPUT:
+    {json.dumps(accounts, indent=2)}
+
+    RULES:
+    - Accounts starting with 1 are typically Assets, 2 Liabilities, 3 Equity, 4 Revenue, 5-6 Expenses.
+    - "amount" is the absolute value of the debit or credit; "balanceType" is "Dr." for a debit and "Cr." for a credit.
+    - Return every input row exactly once and no other accounts. The same account number can appear
+      on several rows (e.g. one per company); return one entry per row.
+
+    OUTPUT FORMAT:
+    Return only a valid JSON object without extra text:
+    {{
+    "assets": [{{"accountNumber": "string", "accountName": "string", "amount": number, "balanceType": "Dr."}}],
+    "liabilities": [],
+    "equity": [],
+    "expenses": [],
+    "revenue": []
+    }}
+    """
+
+        chat_response = complete_chat(api_key, "repair", prompt)
+        response_text = chat_response.choices[0].message.content
+
+        match = re.search(r"```json\n(.*?)\n```", response_text, re.DOTALL)
+        json_data = match.group(1) if match else response_text
+        try:
+            patch = json.loads(json_data)
+        except json.JSONDecodeError as e:
+            print("❌ Error decoding repair JSON:", e)
+            patch = {}
+
+        wanted = Counter(targets["accountNumber"])
+        returned = {category: [] for category in CATEGORIES}
+        for category in CATEGORIES:
+            for entry in patch.get(category) or []:
+                number = _account_key(entry.get("accountNumber"))
+                if wanted[number] > 0:
+                    returned[category].append(entry)
+                    wanted[number] -= 1
+
+        # Accounts the LLM answered in full take the new rows. For the rest the original rows
+        # are kept, so a partial answer never removes rows the input has.
+        incomplete = {number for number, left in wanted.items() if left > 0}
+        for category in CATEGORIES:
+            repaired[category].extend(
+                entry for entry in returned[category]
+                if _account_key(entry.get("accountNumber")) not in incomplete)
+            repaired[category].extend(
+                entry for entry in (classified_data.get(category) or [])
+                if _account_key(entry.get("accountNumber")) in incomplete)
+
+    repaired["totals"], repaired["totals_minor"] = classified_totals(repaired)
+    print(f"✅ Repaired {targets['accountNumber'].nunique()} account(s) and dropped {len(report['phantom'])} phantom account(s).")
+    return json.dumps(repaired, indent=4)
+
+
+def reconcile_and_repair(api_key, classified, cleaned, max_attempts=1):
+    """
+    Reconciles the classification, re-prompting for offending accounts up to max_attempts times.
+    Totals in the returned classification are always the recomputed ones, in rupees under
+    "totals" and exact int paise under "totals_minor".
+
+    Returns:
+    - tuple: (classified JSON string, reconciliation report)
+    """
+    report = reconcile(classified, cleaned)
+    attempts = 0
+    while not report["ok"] and attempts < max_attempts:
+        classified = repair_classification(api_key, classified, cleaned, report)
+        report = reconcile(classified, cleaned)
+        attempts += 1
+
+    classified_data = json.loads(classified)
+    classified_data["totals"] = report["totals"]
+    classified_data["totals_minor"] = report["totals_minor"]
+    report["repair_attempts"] = attempts
+    return json.dumps(classified_data, indent=4), report
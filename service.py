@@ -0,0 +1,314 @@
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from dotenv import load_dotenv
+from artifact_store import ArtifactStore, RunCancelled
+from pipeline import run_pipeline_cached
+
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_DEPTH = 8
+DEFAULT_JOB_TTL_SECONDS = 3600
+DEFAULT_MAX_FINISHED_JOBS = 100
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+SUPPORTED_SUFFIXES = (".csv", ".xlsx", ".xls")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINAL_STATES = {SUCCEEDED, FAILED, CANCELLED}
+RESULT_FIELDS = ["key", "columns", "classified", "reconciliation", "balance_sheet", "pnl",
+                 "pnl_statement", "net_profit", "net_profit_minor", "bs_statement", "memory_report", "routing"]
+JSON_RESULT_FIELDS = {"classified", "balance_sheet", "pnl"}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, file_path):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.status = QUEUED
+        self.stage = None
+        self.error = None
+        self.result = None
+        self.cancel_requested = threading.Event()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested.is_set(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded job queue served by a fixed pool of worker threads running the shared pipeline.
+
+    submit() raises QueueFull once queue_depth jobs are waiting, which the HTTP layer turns
+    into a 429 so callers back off instead of piling up work. Cancellation is cooperative:
+    queued jobs are dropped, running jobs stop at the next stage boundary. A cancelled job
+    that other jobs for the same upload are waiting on keeps the shared run going for them.
+    Finished jobs are kept for job_ttl seconds, and at most max_finished of them, so
+    results do not pile up in memory.
+
+    Parameters:
+    - api_key (str): Mistral API key used for every job.
+    - workers (int): Number of worker threads.
+    - queue_depth (int): Maximum number of jobs waiting to start.
+    - store (ArtifactStore): Store shared with the UI so identical uploads are coalesced.
+    - job_ttl (float): Seconds a finished job and its result stay available.
+    - max_finished (int): Maximum number of finished jobs kept; the oldest are evicted first.
+    """
+
+    def __init__(self, api_key, workers=DEFAULT_WORKERS, queue_depth=DEFAULT_QUEUE_DEPTH, store=None,
+                 job_ttl=DEFAULT_JOB_TTL_SECONDS, max_finished=DEFAULT_MAX_FINISHED_JOBS):
+        self.api_key = api_key
+        self.store = store or ArtifactStore()
+        self.job_ttl = job_ttl
+        self.max_finished = max_finished
+        self.jobs = {}
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"pipeline-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, file_path):
+        job = Job(file_path)
+        with self._lock:
+            self._evict()
+            self.jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self.jobs[job.id]
+            raise QueueFull(f"Queue is full ({self._queue.maxsize} jobs waiting).")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self.jobs.get(job_id)
+
+    def _evict(self):
+        """Drops finished jobs past their TTL, then the oldest beyond max_finished. Caller holds _lock."""
+        now = time.time()
+        finished = sorted(
+            (job for job in self.jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at,
+        )
+        expired = [job for job in finished if now - job.finished_at > self.job_ttl]
+        overflow = finished[len(expired):][:max(len(finished) - len(expired) - self.max_finished, 0)]
+        for job in expired + overflow:
+            del self.jobs[job.id]
+
+    def cancel(self, job_id):
+        """Requests cancellation; finished jobs are returned unchanged."""
+        job = self.get(job_id)
+        if job is None or job.status in FINAL_STATES:
+            return job
+        job.cancel_requested.set()
+        if job.status == QUEUED:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return job
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def is_full(self):
+        return self._queue.full()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job.cancel_requested.is_set():
+                    continue
+                self._run(job)
+            finally:
+                self._cleanup(job)
+                self._queue.task_done()
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+
+        def progress(message):
+            job.stage = message
+            print(f"[{job.id[:8]}] {message}")
+
+        try:
+            result = run_pipeline_cached(self.api_key, job.file_path, self.store, progress=progress,
+                                         cancelled=job.cancel_requested.is_set)
+            # The pipeline passes JSON strings between stages; return them as objects
+            job.result = {
+                field: json.loads(result[field]) if field in JSON_RESULT_FIELDS and result.get(field) else result.get(field)
+                for field in RESULT_FIELDS
+            }
+            job.status = SUCCEEDED
+        except RunCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    @staticmethod
+    def _cleanup(job):
+        try:
+            os.remove(job.file_path)
+        except OSError:
+            pass
+
+
+def _make_handler(jobs):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, indent=2, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _route(self):
+            parts = [p for p in urlparse(self.path).path.split("/") if p]
+            job = jobs.get(parts[1]) if len(parts) >= 2 and parts[0] == "jobs" else None
+            return parts, job
+
+        def do_GET(self):
+            parts, job = self._route()
+            if parts == ["health"]:
+                return self._send_json(200, {"status": "ok", "queue_depth": jobs.depth()})
+            if job is None:
+                return self._send_json(404, {"error": "Job not found"})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if len(parts) == 3 and parts[2] == "result":
+                if job.status != SUCCEEDED:
+                    return self._send_json(409, {"error": f"Job is {job.status}", **job.to_dict()})
+                return self._send_json(200, {"job_id": job.id, **job.result})
+            return self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            parts, job = self._route()
+            if parts == ["jobs"]:
+                return self._submit()
+            if job is not None and len(parts) == 3 and parts[2] == "cancel":
+                return self._cancel(job)
+            return self._send_json(404, {"error": "Not found"})
+
+        def do_DELETE(self):
+            parts, job = self._route()
+            if job is None or len(parts) != 2:
+                return self._send_json(404, {"error": "Job not found"})
+            return self._cancel(job)
+
+        def _cancel(self, job):
+            if job.status in FINAL_STATES:
+                return self._send_json(409, {"error": f"Job is already {job.status}", **job.to_dict()})
+            return self._send_json(202, jobs.cancel(job.id).to_dict())
+
+        def _submit(self):
+            query = parse_qs(urlparse(self.path).query)
+            filename = query.get("filename", [None])[0] or self.headers.get("X-Filename", "upload.xlsx")
+            suffix = os.path.splitext(re.sub(r"[^\w.\-]", "_", filename))[1].lower()
+            if suffix not in SUPPORTED_SUFFIXES:
+                return self._send_json(400, {"error": "Only CSV and Excel files are supported."})
+
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                return self._send_json(400, {"error": "Invalid Content-Length"})
+            if length <= 0:
+                return self._send_json(400, {"error": "Empty upload"})
+            if length > MAX_UPLOAD_BYTES:
+                return self._send_json(413, {"error": "Upload too large"})
+            if jobs.is_full():
+                return self._send_json(429, {"error": "Queue is full"}, {"Retry-After": "30"})
+
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+                remaining = length
+                while remaining > 0:
+                    chunk = self.rfile.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    tmp_file.write(chunk)
+                    remaining -= len(chunk)
+                file_path = tmp_file.name
+
+            if remaining > 0:
+                os.remove(file_path)
+                return self._send_json(400, {"error": f"Upload truncated: {remaining} of {length} bytes missing"})
+
+            try:
+                job = jobs.submit(file_path)
+            except QueueFull as e:
+                os.remove(file_path)
+                return self._send_json(429, {"error": str(e)}, {"Retry-After": "30"})
+            return self._send_json(202, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8000, workers=DEFAULT_WORKERS, queue_depth=DEFAULT_QUEUE_DEPTH,
+          job_ttl=DEFAULT_JOB_TTL_SECONDS, max_finished=DEFAULT_MAX_FINISHED_JOBS):
+    """
+    Starts the headless HTTP service.
+
+    Endpoints:
+    - POST   /jobs?filename=tb.xlsx   upload a trial balance (raw body), returns the job id
+    - GET    /jobs/<id>               job status and current stage
+    - GET    /jobs/<id>/result        structured pipeline output once the job succeeded
+    - POST   /jobs/<id>/cancel        request cancellation (also DELETE /jobs/<id>)
+    - GET    /health                  liveness and queue depth
+    """
+    load_dotenv()
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise ValueError("MISTRAL_API_KEY is not set.")
+
+    jobs = JobQueue(api_key, workers=workers, queue_depth=queue_depth, job_ttl=job_ttl, max_finished=max_finished)
+    server = ThreadingHTTPServer((host, port), _make_handler(jobs))
+    print(f"✅ Trial balance service listening on http://{host}:{port} "
+          f"({workers} workers, queue depth {queue_depth})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve(
+        host=os.getenv("SERVICE_HOST", "127.0.0.1"),
+        port=int(os.getenv("SERVICE_PORT", "8000")),
+        workers=int(os.getenv("SERVICE_WORKERS", DEFAULT_WORKERS)),
+        queue_depth=int(os.getenv("SERVICE_QUEUE_DEPTH", DEFAULT_QUEUE_DEPTH)),
+        job_ttl=float(os.getenv("SERVICE_JOB_TTL", DEFAULT_JOB_TTL_SECONDS)),
+        max_finished=int(os.getenv("SERVICE_MAX_FINISHED_JOBS", DEFAULT_MAX_FINISHED_JOBS)),
+    )